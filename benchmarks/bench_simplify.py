@@ -0,0 +1,90 @@
+"""
+Benchmark for simplify_text / GlossaryMatcher.
+
+Times single-pass glossary replacement over synthetic contract text for a grid of
+text sizes and glossary sizes, and prints throughput so linear scaling can be checked:
+time should grow with text size and stay roughly flat as the glossary grows.
+
+    python benchmarks/bench_simplify.py
+    python benchmarks/bench_simplify.py --text-kb 64 512 4096 --terms 16 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clauseease.text import DEFAULT_GLOSSARY, GlossaryMatcher  # noqa: E402
+
+FILLER = (
+    "The Supplier shall deliver the Goods to the Customer within thirty (30) days of the order. "
+    "Notwithstanding the foregoing, either party may terminate this agreement by written notice. "
+    "The Customer's obligation to pay is subject to the warranty and limitation of liability set out herein. "
+)
+
+
+def make_glossary(n_terms, seed=0):
+    """DEFAULT_GLOSSARY plus n_terms random one- to three-word terms"""
+    rng = random.Random(seed)
+    glossary = dict(DEFAULT_GLOSSARY)
+    while len(glossary) < n_terms:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(rng.randint(1, 3))]
+        glossary[" ".join(words)] = "simple"
+    return glossary
+
+
+def make_text(kb):
+    reps = kb * 1024 // len(FILLER) + 1
+    return (FILLER * reps)[:kb * 1024]
+
+
+def time_replace(matcher, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matcher.replace(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--text-kb", type=int, nargs="+", default=[16, 128, 1024])
+    parser.add_argument("--terms", type=int, nargs="+", default=[16, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'terms':>8} {'compile ms':>11} {'text KB':>8} {'time ms':>9} {'MB/s':>7} {'us/KB':>7}")
+    for n_terms in args.terms:
+        glossary = make_glossary(n_terms)
+        start = time.perf_counter()
+        matcher = GlossaryMatcher(glossary)
+        compile_ms = (time.perf_counter() - start) * 1000
+        for kb in args.text_kb:
+            text = make_text(kb)
+            elapsed = time_replace(matcher, text, args.repeat)
+            row = {
+                "terms": len(matcher),
+                "compile_ms": round(compile_ms, 2),
+                "text_kb": kb,
+                "time_ms": round(elapsed * 1000, 3),
+                "mb_per_s": round(kb / 1024 / elapsed, 2),
+                "us_per_kb": round(elapsed * 1e6 / kb, 2),
+            }
+            results.append(row)
+            print(f"{row['terms']:>8} {row['compile_ms']:>11} {kb:>8} {row['time_ms']:>9} {row['mb_per_s']:>7} {row['us_per_kb']:>7}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks and offline development.
+
+Implements POST /api/generate in both streaming (NDJSON) and non-streaming modes,
+with configurable first-token latency, prompt evaluation and generation speed and error
+rate. Replies carry a "context" that can be passed back to continue the conversation;
+only the new prompt's tokens are then "evaluated". POST /api/embed returns hashed
+bag-of-words vectors, so texts sharing words come out similar:
+
+    python benchmarks/fake_ollama.py --port 11434 --latency 0.2 --tokens-per-s 40
+
+or from Python:
+
+    with FakeOllamaServer(latency=0.05) as server:
+        os.environ["CLAUSEEASE_OLLAMA_URL"] = server.url
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "the supplier shall deliver the goods within thirty days and the customer shall pay "
+    "each invoice on receipt subject to the limitation of liability and termination terms"
+).split()
+
+
+def embed(text, dim=256):
+    """Deterministic stand-in embedding: each word adds +-1 to a hashed coordinate, then L2-normalised"""
+    vec = [0.0] * dim
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        h = int.from_bytes(hashlib.md5(word.encode("utf-8")).digest()[:4], "little")
+        vec[h % dim] += 1.0 if h & (1 << 31) else -1.0
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, obj):
+        line = (json.dumps(obj) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "invalid JSON"})
+
+        if self.path == "/api/embed":
+            texts = body.get("input") or []
+            texts = [texts] if isinstance(texts, str) else texts
+            with server.stats_lock:
+                server.stats["embed_requests"] += 1
+            time.sleep(server.latency)
+            return self._send_json(200, {"model": body.get("model"), "embeddings": [embed(t) for t in texts]})
+        if self.path != "/api/generate":
+            return self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+        with server.stats_lock:
+            server.stats["requests"] += 1
+            server.stats["prompt_chars"] += len(body.get("prompt", ""))
+
+        # ~4 characters per token; prior context is already evaluated, as in the real server
+        prompt_tokens = max(1, len(body.get("prompt", "")) // 4)
+        with server.stats_lock:
+            server.stats["prompt_tokens"] += prompt_tokens
+        time.sleep(server.latency + (prompt_tokens / server.prompt_tokens_per_s if server.prompt_tokens_per_s else 0.0))
+        if server.rng_random() < server.error_rate:
+            with server.stats_lock:
+                server.stats["errors"] += 1
+            return self._send_json(500, {"error": "simulated model failure"})
+
+        tokens = server.make_tokens(body.get("prompt", ""))
+        delay = 1.0 / server.tokens_per_s if server.tokens_per_s else 0.0
+        context = list(body.get("context") or []) + [0] * (prompt_tokens + len(tokens))
+        final = {"model": body.get("model"), "done": True, "context": context, "prompt_eval_count": prompt_tokens,
+                 "eval_count": len(tokens)}
+
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for tok in tokens:
+                if delay:
+                    time.sleep(delay)
+                self._write_chunk({"model": body.get("model"), "response": tok, "done": False})
+            self._write_chunk(dict(final, response=""))
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            if delay:
+                time.sleep(delay * len(tokens))
+            self._send_json(200, dict(final, response="".join(tokens)))
+
+
+class FakeOllamaServer:
+    """
+    Threaded fake Ollama server.
+    latency: seconds before the first token; prompt_tokens_per_s: prompt evaluation speed, added
+    to the first-token delay (0 = instant); tokens_per_s: generation speed (0 = instant);
+    response_tokens: tokens per reply; error_rate: fraction of requests answered with HTTP 500.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, tokens_per_s=0.0, response_tokens=40,
+                 error_rate=0.0, seed=0, prompt_tokens_per_s=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        rng = random.Random(seed)
+        rng_lock = threading.Lock()
+
+        def rng_random():
+            with rng_lock:
+                return rng.random()
+
+        self.httpd.latency = latency
+        self.httpd.tokens_per_s = tokens_per_s
+        self.httpd.prompt_tokens_per_s = prompt_tokens_per_s
+        self.httpd.error_rate = error_rate
+        self.httpd.rng_random = rng_random
+        self.httpd.make_tokens = lambda prompt: [WORDS[(len(prompt) + i) % len(WORDS)] + " " for i in range(response_tokens)]
+        self.httpd.stats = {"requests": 0, "errors": 0, "prompt_chars": 0, "prompt_tokens": 0, "embed_requests": 0}
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        with self.httpd.stats_lock:
+            return dict(self.httpd.stats)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake Ollama /api/generate and /api/embed server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0, help="generation speed (0 = instant)")
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=500.0, help="prompt evaluation speed (0 = instant)")
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(args.host, args.port, args.latency, args.tokens_per_s, args.response_tokens, args.error_rate,
+                              prompt_tokens_per_s=args.prompt_tokens_per_s)
+    print(f"fake Ollama listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
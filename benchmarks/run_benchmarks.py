@@ -0,0 +1,286 @@
+"""
+ClauseEase benchmark suite.
+
+Starts a local fake Ollama server (benchmarks/fake_ollama.py), points the app at it and
+measures extraction, chunking, simplification, model-client latency and end-to-end
+document processing on synthetic 10-500 page contracts, document-library similarity
+search over thousands of synthetic contracts, plus cold import and Streamlit script-run
+times against the app's rerun budget. Results are saved as JSON so
+runs can be compared:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --pages 10 100 --e2e-pages 10 --out base.json
+    python benchmarks/run_benchmarks.py --compare base.json       # exit code 1 on regressions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from fake_ollama import FakeOllamaServer  # noqa: E402
+from synthetic import make_contract_pages, make_pdf  # noqa: E402
+
+
+def measure(fn, repeat):
+    """Run fn repeat times; return (min seconds, median seconds, last result)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+def record(results, name, params, best, median, **extra):
+    row = {"name": name, "params": params, "best_s": round(best, 6), "median_s": round(median, 6)}
+    row.update(extra)
+    results.append(row)
+    shown = " ".join(f"{k}={v}" for k, v in params.items())
+    more = " ".join(f"{k}={v}" for k, v in extra.items())
+    print(f"{name:<24} {shown:<24} best {best * 1000:10.2f} ms  median {median * 1000:10.2f} ms  {more}")
+
+
+def run_suite(args, server):
+    from clauseease.config import CONTEXT_TOKEN_BUDGET
+    from clauseease.extract import DocumentFile
+    from clauseease.pipeline import ClauseEasePipeline
+
+    pipeline = ClauseEasePipeline()
+    results = []
+
+    for pages in args.pages:
+        page_texts = make_contract_pages(pages, seed=pages)
+        text = "".join(page_texts)
+        pdf = make_pdf(page_texts)
+        raw_txt = text.encode("utf-8")
+        params = {"pages": pages}
+
+        best, median, out = measure(lambda: pipeline.extract_text_from_file(DocumentFile(pdf, "contract.pdf")), args.repeat)
+        record(results, "extract_text_pdf", params, best, median, pages_per_s=round(pages / best, 1), chars=len(out))
+
+        best, median, _ = measure(lambda: pipeline.extract_text_from_file(DocumentFile(raw_txt, "contract.txt")), args.repeat)
+        record(results, "extract_text_txt", params, best, median, mb_per_s=round(len(raw_txt) / 2 ** 20 / best, 1))
+
+        best, median, chunks = measure(lambda: pipeline.chunk_text(text), args.repeat)
+        record(results, "chunk_text", params, best, median, chunks=len(chunks), mb_per_s=round(len(text) / 2 ** 20 / best, 1))
+
+        best, median, _ = measure(lambda: pipeline.simplify_text(text), args.repeat)
+        record(results, "simplify_text", params, best, median, mb_per_s=round(len(text) / 2 ** 20 / best, 1))
+
+    # model client against the fake server
+    prompt = "Explain the termination clause in simple terms."
+    best, median, _ = measure(lambda: pipeline.get_response(prompt), args.repeat)
+    record(results, "get_response", {"stream": False}, best, median)
+
+    def first_token():
+        start = time.perf_counter()
+        seen = []
+
+        def on_token(text):
+            if not seen:
+                seen.append(time.perf_counter() - start)
+
+        pipeline.get_response(prompt, on_token=on_token)
+        return seen[0] if seen else None
+
+    ttfts = [first_token() for _ in range(args.repeat)]
+    best, median, _ = measure(lambda: pipeline.get_response(prompt, on_token=lambda text: None), args.repeat)
+    record(results, "get_response", {"stream": True}, best, median,
+           ttft_ms=round(min(t for t in ttfts if t is not None) * 1000, 2) if any(ttfts) else None)
+
+    # a chat about one document: re-sending the document every turn vs continuing the model context
+    doc = "".join(make_contract_pages(3, seed=7))[:CONTEXT_TOKEN_BUDGET * 4]
+    questions = [f"Question {i}: what are the payment and termination terms?" for i in range(args.chat_turns)]
+
+    def stateless():
+        for q in questions:
+            pipeline.get_response(f"{doc}\n\nUser: {q}", on_token=lambda text: None)
+
+    def continued():
+        context = None
+        for i, q in enumerate(questions):
+            final = {}
+            prompt = f"{doc}\n\nUser: {q}" if i == 0 else f"User: {q}"
+            pipeline.get_response(prompt, on_token=lambda text: None, context=context, on_done=final.update)
+            context = final.get("context")
+
+    for mode, fn in (("resend", stateless), ("context", continued)):
+        before = server.stats["prompt_tokens"]
+        best, median, _ = measure(fn, args.repeat)
+        record(results, "chat_turns", {"turns": args.chat_turns, "mode": mode}, best, median,
+               prompt_tokens=(server.stats["prompt_tokens"] - before) // args.repeat)
+
+    # end to end: unique documents per run so neither the chunk store nor the summary cache hits
+    for pages in args.e2e_pages:
+        params = {"pages": pages, "workers": args.workers}
+        docs = [make_pdf(make_contract_pages(pages, seed=10_000 + pages * 100 + i)) for i in range(args.repeat)]
+        before = server.stats["requests"]
+        times = []
+        chunk_count = 0
+        for i, pdf in enumerate(docs):
+            start = time.perf_counter()
+            result = pipeline.process_document(DocumentFile(pdf, f"e2e-{pages}-{i}.pdf"), max_workers=args.workers)
+            times.append(time.perf_counter() - start)
+            if not result["success"]:
+                raise RuntimeError(f"process_document failed: {result.get('error')}")
+            chunk_count = len(result["chunk_texts"])
+        best = min(times)
+        record(results, "process_document", params, best, statistics.median(times), chunks=chunk_count,
+               chunks_per_s=round(chunk_count / best, 1),
+               model_calls=(server.stats["requests"] - before) // len(docs))
+
+    return results
+
+
+def run_corpus(args):
+    """Top-k search over a library of random unit embeddings: everything, and scoped to a few documents"""
+    import numpy as np
+
+    from clauseease.config import CORPUS_TOP_K
+    from clauseease.corpus import DocumentCorpus
+
+    results = []
+    rng = np.random.default_rng(0)
+    for docs in args.corpus_docs:
+        for dtype in ("float32", "int8"):
+            corpus = DocumentCorpus(tempfile.mkdtemp(prefix="clauseease-corpus-"), int8=dtype == "int8")
+            start = time.perf_counter()
+            for d in range(docs):
+                vectors = rng.standard_normal((args.corpus_chunks, args.corpus_dim), dtype=np.float32)
+                corpus.add(f"doc{d}", f"contract-{d}.pdf", [f"chunk {i}" for i in range(args.corpus_chunks)], vectors)
+            build = time.perf_counter() - start
+            queries = rng.standard_normal((max(args.repeat, 5), args.corpus_dim), dtype=np.float32)
+            scoped = [f"doc{d}" for d in rng.choice(docs, size=min(3, docs), replace=False)]
+            params = {"docs": docs, "chunks": docs * args.corpus_chunks, "dtype": dtype}
+            for scope, keys in (("all", None), ("3 docs", scoped)):
+                times = []
+                for q in queries:
+                    t = time.perf_counter()
+                    corpus.search(q, top_k=CORPUS_TOP_K, doc_keys=keys, per_document=2)
+                    times.append(time.perf_counter() - t)
+                record(results, "corpus_search", dict(params, scope=scope), min(times), statistics.median(times),
+                       matrix_mb=round(corpus.usage()["bytes"] / 2 ** 20, 1), build_s=round(build, 2))
+    return results
+
+
+def run_startup(args):
+    """Cold import of the app in a fresh interpreter, then first run and reruns of the Streamlit script"""
+    from clauseease.config import RERUN_BUDGET_MS
+
+    results = []
+    app_dir = os.path.dirname(HERE)
+    best, median, _ = measure(
+        lambda: subprocess.run([sys.executable, "-c", "import clauseease_chatbot"], cwd=app_dir, check=True),
+        args.repeat)
+    record(results, "import_app", {}, best, median)
+
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        print("streamlit.testing not available, skipping script-run timings")
+        return results
+
+    # the app times its own script runs (st.session_state.last_script_run_ms), excluding AppTest overhead
+    app = AppTest.from_file(os.path.join(app_dir, "clauseease_chatbot.py"), default_timeout=60)
+    app.run()
+    first = app.session_state.last_script_run_ms / 1000
+    record(results, "app_first_run", {}, first, first)
+    reruns = []
+    for _ in range(max(args.repeat, 5)):
+        app.run()
+        reruns.append(app.session_state.last_script_run_ms / 1000)
+    median = statistics.median(reruns)
+    record(results, "app_rerun", {}, min(reruns), median, budget_ms=RERUN_BUDGET_MS,
+           within_budget=median * 1000 <= RERUN_BUDGET_MS)
+    return results
+
+
+def compare(current, baseline_path, threshold):
+    """Print per-benchmark change against a saved run; return the regressions"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    def key(row):
+        return row["name"], json.dumps(row["params"], sort_keys=True)
+
+    base = {key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\ncompared with {baseline_path} (regression threshold {threshold:.0%})")
+    for row in current:
+        old = base.get(key(row))
+        if not old:
+            continue
+        change = row["best_s"] / old["best_s"] - 1 if old["best_s"] else 0.0
+        flag = "REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(row)
+        print(f"{row['name']:<24} {key(row)[1]:<36} {old['best_s'] * 1000:10.2f} -> {row['best_s'] * 1000:10.2f} ms  {change:+7.1%} {flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ClauseEase benchmark suite against a fake Ollama server.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500], help="document sizes for the local stages")
+    parser.add_argument("--e2e-pages", type=int, nargs="+", default=[10, 100], help="document sizes for process_document")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chat-turns", type=int, default=5, help="questions per chat_turns run")
+    parser.add_argument("--workers", type=int, default=4, help="summary workers for process_document")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server: seconds before the first token")
+    parser.add_argument("--tokens-per-s", type=float, default=0.0, help="fake server: generation speed (0 = instant)")
+    parser.add_argument("--prompt-tokens-per-s", type=float, default=0.0,
+                        help="fake server: prompt evaluation speed (0 = instant)")
+    parser.add_argument("--response-tokens", type=int, default=40, help="fake server: tokens per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake server: fraction of failed requests")
+    parser.add_argument("--corpus-docs", type=int, nargs="+", default=[1000, 5000],
+                        help="library sizes (documents) for corpus_search")
+    parser.add_argument("--corpus-chunks", type=int, default=40, help="chunks per library document")
+    parser.add_argument("--corpus-dim", type=int, default=768, help="embedding size for corpus_search")
+    parser.add_argument("--out", help="results file (default benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    with FakeOllamaServer(latency=args.latency, tokens_per_s=args.tokens_per_s,
+                          response_tokens=args.response_tokens, error_rate=args.error_rate,
+                          prompt_tokens_per_s=args.prompt_tokens_per_s) as server:
+        # configuration is read at import time, so point the app at the fake server and a scratch data dir first
+        os.environ["CLAUSEEASE_OLLAMA_URL"] = server.url
+        os.environ["CLAUSEEASE_HOME"] = tempfile.mkdtemp(prefix="clauseease-bench-")
+        os.environ["CLAUSEEASE_MAX_INFLIGHT"] = str(max(args.workers, 1))
+        results = run_suite(args, server) + run_corpus(args) + run_startup(args)
+        server_stats = server.stats
+
+    out = args.out or os.path.join(HERE, "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    payload = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "fake_server": server_stats,
+        },
+        "results": results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"\nresults written to {out}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Synthetic contracts for benchmarks: plain text pages and a dependency-free PDF writer"""
+import random
+
+CLAUSES = [
+    "The Supplier shall deliver the Goods to the Customer within thirty (30) days of the Purchase Order.",
+    "Notwithstanding the foregoing, either party may terminate this agreement upon written notice to the other party.",
+    "The Customer shall pay each invoice within forty-five (45) days of receipt, without set-off or deduction.",
+    "Each party shall indemnify the other against all losses arising from its breach of this agreement.",
+    "The Supplier warrants that the Services will be performed with reasonable skill and care.",
+    "Neither party's liability under this agreement shall exceed the fees paid in the preceding twelve (12) months.",
+    "All Confidential Information shall be kept secret and used only for the purposes of this agreement.",
+    "This agreement shall be governed by and construed in accordance with the laws of England and Wales.",
+    "Any notice shall be in writing and delivered by hand, by courier or by email to the address set out above.",
+    "The Customer may, pursuant to clause 14, audit the Supplier's records once in any calendar year.",
+    "Hereinafter the party of the first part shall be referred to as the Licensor.",
+    "In lieu of payment, the parties may agree a service credit equal to five percent (5%) of the monthly fee.",
+]
+WORDS_PER_PAGE = 450
+
+
+def make_contract_pages(n_pages, seed=0):
+    """n_pages of contract-like text (~450 words each) with numbered section headings"""
+    rng = random.Random(seed)
+    pages = []
+    section = 1
+    for p in range(n_pages):
+        lines = []
+        words = 0
+        while words < WORDS_PER_PAGE:
+            if rng.random() < 0.15:
+                lines.append("")
+                lines.append(f"{section}. {rng.choice(['DEFINITIONS', 'PAYMENT', 'TERM AND TERMINATION', 'LIABILITY', 'CONFIDENTIALITY', 'GENERAL'])}")
+                section += 1
+            clause = rng.choice(CLAUSES)
+            # vary the text so documents and chunks are not byte-identical
+            clause = clause.replace("Goods", rng.choice(["Goods", "Products", "Deliverables"])) + f" (Ref {seed}-{p}-{words})"
+            lines.append(clause)
+            words += len(clause.split())
+        pages.append("\n".join(lines) + "\n")
+    return pages
+
+
+def _wrap(text, width=95):
+    out = []
+    for para in text.split("\n"):
+        line = ""
+        for word in para.split():
+            if line and len(line) + 1 + len(word) > width:
+                out.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        out.append(line)
+    return out
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace")
+
+
+def make_pdf(pages):
+    """Minimal PDF (Helvetica text, one content stream per page) readable by PyPDF2"""
+    objects = []
+
+    def add(obj):
+        objects.append(obj)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(b"")  # filled in once the page ids are known
+    kids = []
+    for page in pages:
+        lines = _wrap(page)
+        content = b"BT /F1 8 Tf 40 800 Td 9 TL " + b" ".join(b"(" + _pdf_escape(l) + b") '" for l in lines) + b" ET"
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, stream, font)
+        ))
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    return bytes(out)
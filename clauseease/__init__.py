@@ -0,0 +1 @@
+"""ClauseEase: contract simplification on a local Ollama server, shared by the web UI and the batch CLI."""
@@ -0,0 +1,209 @@
+"""Precomputed replies: quick-action prompts and standard questions about processed documents."""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+from .config import (
+    CANNED_TTL, CHUNK_STORE_MAX_DAYS, DATA_DIR, EXAMPLE_PROMPT, HELP_PROMPT, MODEL_NAME, MORE_EXAMPLE_PROMPTS,
+    PREPARED_MATCH, STANDARD_QUESTIONS,
+)
+from .metrics import get_metrics
+from .ollama import OllamaError, get_ollama_client
+from .pipeline import ClauseEasePipeline
+from .text import tokenize
+
+
+class CannedResponses:
+    """
+    Precomputed replies for fixed prompts (the quick-action buttons).
+    warm() loads the model and fills every prompt on a background thread. A reply expires
+    after ttl; the lookup that finds it stale misses and schedules a background refresh.
+    Error replies are never stored.
+    """
+
+    def __init__(self, prompts, ttl=CANNED_TTL):
+        self.prompts = list(prompts)
+        self.ttl = ttl
+        self.pipeline = ClauseEasePipeline()
+        self._replies = {}          # prompt -> (reply, expires_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, prompt):
+        with self._lock:
+            entry = self._replies.get(prompt)
+        if entry is not None and entry[1] > time.time():
+            get_metrics().inc("canned_responses_total", result="hit")
+            return entry[0]
+        get_metrics().inc("canned_responses_total", result="miss")
+        if prompt in self.prompts:
+            self.refresh([prompt])
+        return None
+
+    def put(self, prompt, reply):
+        if prompt in self.prompts and not self.pipeline.is_error_response(reply):
+            with self._lock:
+                self._replies[prompt] = (reply, time.time() + self.ttl)
+
+    def refresh(self, prompts=None, warm_up=False):
+        with self._lock:
+            todo = [p for p in (prompts or self.prompts) if p not in self._refreshing]
+            self._refreshing.update(todo)
+        if todo or warm_up:
+            threading.Thread(target=self._fill, args=(todo, warm_up), name="clauseease-canned", daemon=True).start()
+
+    def warm(self):
+        self.refresh(warm_up=True)
+
+    def _fill(self, prompts, warm_up):
+        if warm_up:
+            try:
+                get_ollama_client().warm_up()
+            except OllamaError:
+                pass    # the prompts below report (and count) the failure
+        for prompt in prompts:
+            try:
+                self.put(prompt, self.pipeline.get_response(prompt))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(prompt)
+
+
+@st.cache_resource(show_spinner=False)
+def get_canned_responses():
+    """Quick-action replies shared by every session; warming starts with the first script run"""
+    canned = CannedResponses((HELP_PROMPT, EXAMPLE_PROMPT) + MORE_EXAMPLE_PROMPTS)
+    canned.warm()
+    return canned
+
+
+class PreparedAnswers:
+    """
+    Answers to the standard questions for processed documents (SQLite, WAL), computed speculatively.
+    prepare() queues a document for a background thread that asks each question the way a fresh chat
+    would (ClauseEasePipeline.document_prompt), holding one of the model slots summarization uses so
+    interactive replies never wait behind it. Answers are keyed by doc_key, so an edited document
+    never gets its previous version's answers; another model's or a dropped question's answers are
+    deleted when the document is prepared again. Error replies are never stored.
+    """
+
+    def __init__(self, path, questions=STANDARD_QUESTIONS, model=MODEL_NAME, threshold=PREPARED_MATCH,
+                 max_days=CHUNK_STORE_MAX_DAYS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.questions = list(questions)
+        self.model = model
+        self.threshold = threshold
+        self.pipeline = ClauseEasePipeline()
+        self._terms = [(q, self.terms(q)) for q in self.questions]
+        self._pending = set()       # doc_keys queued or being answered
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "doc_key TEXT NOT NULL, question TEXT NOT NULL, model TEXT NOT NULL, answer TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (doc_key, question)) WITHOUT ROWID"
+        )
+        if max_days:
+            self._conn.execute("DELETE FROM answers WHERE created < ?", (time.time() - max_days * 86400,))
+        if self.questions:
+            threading.Thread(target=self._work, name="clauseease-prepared", daemon=True).start()
+
+    # words that don't change what is being asked
+    FILLER = frozenset("there any all please tell list explain summarize summarise contract agreement document".split())
+
+    @classmethod
+    def terms(cls, text):
+        """Content words of a question, with a plural "s" dropped"""
+        words = (w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in tokenize(text))
+        return frozenset(w for w in words if w not in cls.FILLER)
+
+    def match(self, question):
+        """
+        The standard question that question asks, or None. A question with a content word of its own
+        ("... for the supplier?") is more specific than the stored answer and never matches.
+        """
+        words = self.terms(question)
+        best, best_score = None, self.threshold
+        for standard, terms in self._terms:
+            if words and words <= terms:
+                score = len(words) / len(terms)
+                if score >= best_score:
+                    best, best_score = standard, score
+        return best
+
+    def get(self, doc_key, question):
+        """Stored answer for doc_key to the standard question matching question, or None"""
+        standard = self.match(question)
+        if standard is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT answer FROM answers WHERE doc_key = ? AND question = ? AND model = ?",
+                                     (doc_key, standard, self.model)).fetchone()
+            result = "hit" if row else ("pending" if doc_key in self._pending else "miss")
+        get_metrics().inc("prepared_answers_total", result=result)
+        return row[0] if row else None
+
+    def answered(self, doc_key):
+        """Standard questions with an answer stored for doc_key"""
+        with self._lock:
+            rows = self._conn.execute("SELECT question FROM answers WHERE doc_key = ? AND model = ?",
+                                      (doc_key, self.model)).fetchall()
+        return {q for q, in rows}
+
+    def pending(self, doc_key):
+        with self._lock:
+            return doc_key in self._pending
+
+    def prepare(self, doc_key, index, doc_ctx):
+        """Answer the standard questions for a processed document (its LexicalIndex and merged summary) in the background"""
+        if not self.questions or index is None:
+            return
+        with self._lock:
+            if doc_key in self._pending:
+                return
+            marks = ",".join("?" * len(self.questions))
+            self._conn.execute(f"DELETE FROM answers WHERE doc_key = ? AND (model != ? OR question NOT IN ({marks}))",
+                               [doc_key, self.model] + self.questions)
+            self._pending.add(doc_key)
+        self._queue.put((doc_key, index, doc_ctx))
+
+    def _work(self):
+        while True:
+            doc_key, index, doc_ctx = self._queue.get()
+            try:
+                self._answer(doc_key, index, doc_ctx)
+            finally:
+                with self._lock:
+                    self._pending.discard(doc_key)
+                self._queue.task_done()
+
+    def _answer(self, doc_key, index, doc_ctx):
+        done = self.answered(doc_key)
+        client = get_ollama_client()
+        for question in self.questions:
+            if question in done:
+                continue
+            prompt, _ = self.pipeline.document_prompt(question, index, doc_ctx)
+            with client.slots:
+                answer = self.pipeline.get_response(prompt)
+            if self.pipeline.is_error_response(answer):
+                # most likely the model is down; the user's own question will report it
+                get_metrics().inc("prepared_answer_errors_total")
+                return
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO answers (doc_key, question, model, answer, created) VALUES (?, ?, ?, ?, ?)",
+                    (doc_key, question, self.model, answer, time.time()),
+                )
+
+
+@st.cache_resource(show_spinner=False)
+def get_prepared_answers():
+    """Standard-question answers shared by every session in this server process"""
+    return PreparedAnswers(os.path.join(DATA_DIR, "answers.sqlite3"))
@@ -0,0 +1,158 @@
+"""Settings, read once from CLAUSEEASE_* environment variables at import time."""
+import importlib
+import os
+
+# Local model server
+OLLAMA_URL = os.environ.get("CLAUSEEASE_OLLAMA_URL", "http://localhost:11434")
+MODEL_NAME = os.environ.get("CLAUSEEASE_MODEL", "llama3.2")
+MODEL_TIMEOUT = int(os.environ.get("CLAUSEEASE_MODEL_TIMEOUT", "180"))
+# Transient model-server failures (connection refused, timeouts, HTTP 429/5xx) are retried up to
+# MODEL_RETRIES times with jittered exponential backoff. After BREAKER_FAILURES consecutive ones the
+# circuit opens: requests fail fast for BREAKER_COOLDOWN seconds, then a single trial request decides.
+MODEL_RETRIES = int(os.environ.get("CLAUSEEASE_MODEL_RETRIES", "2"))
+MODEL_BACKOFF = float(os.environ.get("CLAUSEEASE_MODEL_BACKOFF", "0.5"))
+BREAKER_FAILURES = int(os.environ.get("CLAUSEEASE_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("CLAUSEEASE_BREAKER_COOLDOWN", "15"))
+# How long Ollama keeps the model loaded after a request (Ollama duration string, e.g. "30m", "-1" = forever)
+MODEL_KEEP_ALIVE = os.environ.get("CLAUSEEASE_KEEP_ALIVE", "30m")
+# Model context window (tokens; should match the model's num_ctx). Chat conversations are carried
+# over between turns with Ollama's returned context and restart once they would no longer fit.
+MODEL_CONTEXT_TOKENS = int(os.environ.get("CLAUSEEASE_MODEL_CONTEXT", "4096"))
+
+# Document summarization concurrency. SUMMARY_WORKERS is the pool size per document;
+# MAX_INFLIGHT caps concurrent model calls across every session in this process so a
+# local Ollama server is never flooded.
+SUMMARY_WORKERS = int(os.environ.get("CLAUSEEASE_WORKERS", "4"))
+SUMMARY_RETRIES = int(os.environ.get("CLAUSEEASE_RETRIES", "2"))
+MAX_INFLIGHT = int(os.environ.get("CLAUSEEASE_MAX_INFLIGHT", str(SUMMARY_WORKERS)))
+
+
+# Chunk sizing in estimated model tokens; consecutive chunks share up to CHUNK_OVERLAP_TOKENS
+CHUNK_TOKENS = int(os.environ.get("CLAUSEEASE_CHUNK_TOKENS", "600"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CLAUSEEASE_CHUNK_OVERLAP", "60"))
+
+# PDFs with at least this many pages are extracted on a process pool (0 disables the pool)
+PDF_POOL_MIN_PAGES = int(os.environ.get("CLAUSEEASE_PDF_POOL_PAGES", "150"))
+PDF_POOL_WORKERS = int(os.environ.get("CLAUSEEASE_PDF_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_POOL_BATCH_PAGES = 10
+
+# Optional user glossary (JSON object, or CSV/TSV "term,replacement" rows) merged over DEFAULT_GLOSSARY
+GLOSSARY_PATH = os.environ.get("CLAUSEEASE_GLOSSARY", "")
+
+# Persistent app data (summary cache, ...)
+DATA_DIR = os.environ.get("CLAUSEEASE_HOME", os.path.join(os.path.expanduser("~"), ".clauseease"))
+SUMMARY_CACHE_MAX_MB = float(os.environ.get("CLAUSEEASE_CACHE_MAX_MB", "256"))
+
+# Near-duplicate chunks (estimated Jaccard similarity of word 5-gram sets >= DEDUP_THRESHOLD, and
+# identical numbers and negations) reuse an existing summary instead of calling the model.
+# 0 disables. The MinHash/LSH index is in memory and keeps the DEDUP_MAX_ENTRIES newest chunks.
+DEDUP_THRESHOLD = float(os.environ.get("CLAUSEEASE_DEDUP_THRESHOLD", "0.9"))
+DEDUP_MAX_ENTRIES = int(os.environ.get("CLAUSEEASE_DEDUP_MAX_ENTRIES", "20000"))
+
+# Chunk store cleanup: documents unused for CHUNK_STORE_MAX_DAYS, or the least recently used
+# ones beyond CHUNK_STORE_MAX_MB in total, are deleted
+CHUNK_STORE_MAX_DAYS = float(os.environ.get("CLAUSEEASE_CHUNK_STORE_DAYS", "30"))
+CHUNK_STORE_MAX_MB = float(os.environ.get("CLAUSEEASE_CHUNK_STORE_MB", "512"))
+
+# Metrics are written to DATA_DIR/metrics.json and DATA_DIR/metrics.prom at most this often (seconds)
+METRICS_EXPORT_INTERVAL = float(os.environ.get("CLAUSEEASE_METRICS_INTERVAL", "15"))
+
+# Uploaded documents are processed by this many background worker threads (shared by all sessions);
+# finished jobs are kept for JOB_RETENTION seconds so their session can pick up the result
+JOB_WORKERS = int(os.environ.get("CLAUSEEASE_JOB_WORKERS", "2"))
+JOB_RETENTION = 3600
+
+# Chat history is kept in DATA_DIR/chats.sqlite3 and shown CHAT_PAGE_SIZE messages at a time;
+# older ones load on demand. New messages are written in batches of up to CHAT_WRITE_BATCH.
+# A browser's chats are found by the random ?user= id in the page URL. That id is the only thing
+# guarding them: anyone given the link can read those contract chats, so don't share it, and put
+# the app behind real authentication (e.g. a reverse proxy) when more than one person can reach it.
+CHAT_PAGE_SIZE = int(os.environ.get("CLAUSEEASE_CHAT_PAGE", "30"))
+CHAT_WRITE_BATCH = 20
+
+# Per-session memory. Document summaries, long replies (over LONG_MESSAGE_CHARS) and the model
+# conversation are kept zlib-compressed outside st.session_state and referenced by handle: each
+# session may hold SESSION_MEMORY_MB of them, all sessions together SESSION_STORE_MB, coldest first
+# out (evicted values are reloaded from the chat store). A session whose st.session_state grows past
+# SESSION_MEMORY_MB lets go of older loaded messages. Document search indexes are shared by all
+# sessions with the same document, up to DOC_INDEX_CACHE_MB, and rebuilt from the chunk store.
+SESSION_MEMORY_MB = float(os.environ.get("CLAUSEEASE_SESSION_MEMORY_MB", "4"))
+SESSION_STORE_MB = float(os.environ.get("CLAUSEEASE_SESSION_STORE_MB", "256"))
+DOC_INDEX_CACHE_MB = float(os.environ.get("CLAUSEEASE_DOC_INDEX_CACHE_MB", "512"))
+LONG_MESSAGE_CHARS = 2000
+
+# Wall-time budget for one script run that doesn't wait on the model; slower runs are counted
+# in the script_run_over_budget_total metric (see benchmarks/run_benchmarks.py for cold start)
+RERUN_BUDGET_MS = float(os.environ.get("CLAUSEEASE_RERUN_BUDGET_MS", "150"))
+
+# Document library: the chunks of every processed document are embedded with EMBED_MODEL (Ollama)
+# into DATA_DIR/corpus, a memory-mapped matrix (int8 with a per-row scale when CORPUS_INT8 is set
+# before the library is created), so chat questions can search one, several or all documents.
+# An empty CLAUSEEASE_EMBED_MODEL turns the library off.
+EMBED_MODEL = os.environ.get("CLAUSEEASE_EMBED_MODEL", "nomic-embed-text")
+EMBED_BATCH = 16
+CORPUS_INT8 = os.environ.get("CLAUSEEASE_CORPUS_INT8", "0") == "1"
+CORPUS_TOP_K = int(os.environ.get("CLAUSEEASE_CORPUS_TOP_K", "8"))
+
+# Chat context retrieval: how many passages to consider and how many (estimated) tokens they may use
+CONTEXT_TOP_K = int(os.environ.get("CLAUSEEASE_CONTEXT_TOP_K", "4"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CLAUSEEASE_CONTEXT_TOKENS", "1500"))
+
+# Standard first questions, answered in the background as soon as a document is processed and kept
+# with it in DATA_DIR/answers.sqlite3 (per document and model, for CHUNK_STORE_MAX_DAYS). A chat
+# question about the current document that asks nothing beyond one of them (no content words of its
+# own) and covers at least PREPARED_MATCH of its words gets the stored answer at once.
+# "|"-separated; empty turns this off.
+STANDARD_QUESTIONS = tuple(q.strip() for q in os.environ.get(
+    "CLAUSEEASE_STANDARD_QUESTIONS",
+    "What are the termination terms?|What are the payment obligations?|Is there a cap on liability?|"
+    "What are the key deadlines?",
+).split("|") if q.strip())
+PREPARED_MATCH = float(os.environ.get("CLAUSEEASE_PREPARED_MATCH", "0.6"))
+
+# Fixed prompts behind the quick-action buttons. Their replies are precomputed in the background at
+# startup (after a warm-up request loads the model) and reused for CANNED_TTL seconds.
+HELP_PROMPT = "help"
+EXAMPLE_PROMPT = "simplify Either party may terminate this agreement with a thirty (30) days written notice to the other party"
+MORE_EXAMPLE_PROMPTS = (
+    "simplify Notwithstanding anything to the contrary herein",
+    "What does indemnification mean?",
+    "Explain termination clauses in simple terms",
+)
+CANNED_TTL = float(os.environ.get("CLAUSEEASE_CANNED_TTL", "3600"))
+
+# Chunk summarization prompt; part of the summary cache key, so editing it invalidates old entries
+CHUNK_PROMPT_TEMPLATE = (
+    "You are ClauseEase assistant. Summarize the following document chunk in 2-4 short sentences. "
+    "List any key obligations, deadlines, or party duties if present.\n\nChunk ({position}):\n{chunk}\n\nSummary:"
+)
+
+# Clause pre-tagging: a regex pass tags every chunk with clause types before summarization.
+# Chunks with nothing substantive (signature blocks, definitions, short headings) get a local
+# summary instead of a model call; the others get a prompt focused on the clause types found.
+PRETAG_CHUNKS = os.environ.get("CLAUSEEASE_PRETAG", "1") != "0"
+FOCUSED_PROMPT_TEMPLATE = (
+    "You are ClauseEase assistant. Summarize the following document chunk in 2-4 short sentences. "
+    "Focus on {focus}.\n\nChunk ({{position}}):\n{{chunk}}\n\nSummary:"
+)
+
+
+# Map-reduce merge of chunk summaries: groups of REDUCE_GROUP_SIZE are merged level by level
+# until the document summary fits SUMMARY_TARGET_CHARS
+REDUCE_GROUP_SIZE = int(os.environ.get("CLAUSEEASE_REDUCE_GROUP", "4"))
+SUMMARY_TARGET_CHARS = int(os.environ.get("CLAUSEEASE_SUMMARY_CHARS", "4000"))
+REDUCE_PROMPT_TEMPLATE = (
+    "You are ClauseEase assistant. Combine the following summaries of consecutive sections of one contract "
+    "into a single summary of at most 5 short sentences. Keep key obligations, deadlines, amounts and party duties."
+    "\n\nSections ({position}):\n{chunk}\n\nCombined summary:"
+)
+
+
+# The PDF extraction library (PyPDF2) and requests are imported on first use:
+# most reruns never touch them and together they add ~200 ms to a cold start
+def optional_import(module, name):
+    """Attribute `name` of an optional dependency, imported on first use; None if it is not installed"""
+    try:
+        return getattr(importlib.import_module(module), name)
+    except Exception:
+        return None
@@ -0,0 +1,276 @@
+"""Document library: chunk embeddings of every processed document, searchable together."""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+from .config import CORPUS_INT8, CORPUS_TOP_K, DATA_DIR, EMBED_MODEL
+
+
+class DocumentCorpus:
+    """
+    Persistent library of processed documents for semantic search.
+    Documents and chunk texts live in SQLite; chunk embeddings (L2-normalised) are the rows of a
+    flat binary matrix that is memory-mapped for search, float32 or int8 with a per-row scale.
+    Documents are appended incrementally. Removing one drops its rows from the search at once;
+    compact() rewrites the matrix once more than half of it is dead.
+    Several processes (the app, clauseease_batch.py --library) may share a library: changes hold
+    SQLite's write lock and bump a stored version that the others check before they read.
+    """
+
+    def __init__(self, root, int8=CORPUS_INT8):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self._lock = threading.Lock()
+        # a compaction by another process holds the write lock while it rewrites the matrix
+        self._conn = sqlite3.connect(os.path.join(root, "corpus.sqlite3"), check_same_thread=False,
+                                     isolation_level=None, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (id INTEGER PRIMARY KEY, doc_key TEXT UNIQUE, filename TEXT, "
+            "added REAL, chunks INTEGER)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS passages (row INTEGER PRIMARY KEY, doc_id INTEGER, "
+                           "chunk INTEGER, text TEXT)")
+        settings = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        # the matrix layout is fixed when the library is created
+        self.dtype = np.dtype(settings.get("dtype") or ("int8" if int8 else "float32"))
+        self._conn.execute("INSERT OR IGNORE INTO settings VALUES ('dtype', ?)", (self.dtype.name,))
+        self.dim = None
+        self._version = None
+        with self._lock:
+            self._refresh()
+
+    def _path(self, ext):
+        return os.path.join(self.root, "vectors" + ext)
+
+    def _refresh(self):
+        """
+        Reload if the library changed since we last looked, e.g. from clauseease_batch.py --library
+        in another process (every change bumps the stored version). Call with _lock held.
+        Returns the stored row count.
+        """
+        settings = dict(self._conn.execute(
+            "SELECT key, value FROM settings WHERE key IN ('rows', 'dim', 'version')").fetchall())
+        rows = int(settings.get("rows", 0))
+        version = int(settings.get("version", 0))
+        if version != self._version:
+            self.dim = int(settings["dim"]) if "dim" in settings else None
+            self._version = version
+            self._load(rows)
+        return rows
+
+    def _bump_version(self):
+        """Mark a change for other processes; call inside the write transaction"""
+        self._version += 1
+        self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('version', ?)", (str(self._version),))
+
+    def _load(self, rows):
+        """Read document metadata and the row -> document map, and map the matrix"""
+        self._docs = {doc_id: {"doc_key": key, "filename": name, "added": added, "chunks": chunks}
+                      for doc_id, key, name, added, chunks in self._conn.execute("SELECT * FROM documents")}
+        self._ids = {d["doc_key"]: doc_id for doc_id, d in self._docs.items()}
+        row_doc = np.full(rows, -1, dtype=np.int32)     # -1 marks a removed document's row
+        pairs = np.array(self._conn.execute("SELECT row, doc_id FROM passages").fetchall(), dtype=np.int64)
+        if len(pairs):
+            pairs = pairs[pairs[:, 0] < rows]   # committed by another process after we read the row count
+            row_doc[pairs[:, 0]] = pairs[:, 1]
+        self._row_doc = row_doc
+        self._map()
+
+    def _map(self):
+        rows = len(self._row_doc)
+        self._matrix = (np.memmap(self._path(".bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+                        if rows else None)
+        self._scales = (np.fromfile(self._path(".scale"), dtype=np.float32, count=rows)
+                        if rows and self.dtype == np.int8 else None)
+
+    def _encode(self, vectors):
+        """Normalised float32 rows -> (matrix rows to store, per-row scales or None)"""
+        if self.dtype != np.int8:
+            return vectors.astype(self.dtype), None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    @staticmethod
+    def _write_rows(path, start, data):
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(start)
+            f.write(data.tobytes())
+            f.truncate()
+
+    def has(self, doc_key):
+        with self._lock:
+            self._refresh()
+            return doc_key in self._ids
+
+    def has_documents(self):
+        with self._lock:
+            self._refresh()
+            return bool(self._ids)
+
+    def documents(self):
+        """[{"doc_key", "filename", "added", "chunks"}], most recently added first"""
+        with self._lock:
+            self._refresh()
+            docs = list(self._docs.values())
+        return sorted(docs, key=lambda d: -d["added"])
+
+    def add(self, doc_key, filename, texts, vectors):
+        """Add a document's chunk texts and their embeddings; False if it is already in the library"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError("need one embedding per chunk")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock, self._conn:
+            # the write lock, held until commit, reserves the rows past the stored count for us
+            self._conn.execute("BEGIN IMMEDIATE")
+            start = self._refresh()
+            if doc_key in self._ids:
+                return False
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"embedding size {vectors.shape[1]} does not match the library's {self.dim} "
+                                 "(was the embedding model changed?)")
+            data, scales = self._encode(vectors)
+            # vectors first: rows past the stored row count are ignored if we stop half way
+            self._write_rows(self._path(".bin"), start * self.dim * self.dtype.itemsize, data)
+            if scales is not None:
+                self._write_rows(self._path(".scale"), start * 4, scales)
+            added = time.time()
+            doc_id = self._conn.execute(
+                "INSERT INTO documents (doc_key, filename, added, chunks) VALUES (?, ?, ?, ?)",
+                (doc_key, filename, added, len(texts)),
+            ).lastrowid
+            self._conn.executemany("INSERT INTO passages VALUES (?, ?, ?, ?)",
+                                   [(start + i, doc_id, i, text) for i, text in enumerate(texts)])
+            self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('rows', ?)", (str(start + len(texts)),))
+            self._bump_version()
+            self._docs[doc_id] = {"doc_key": doc_key, "filename": filename, "added": added, "chunks": len(texts)}
+            self._ids[doc_key] = doc_id
+            self._row_doc = np.concatenate([self._row_doc, np.full(len(texts), doc_id, dtype=np.int32)])
+            self._map()
+        return True
+
+    def remove(self, doc_key):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._refresh()
+                doc_id = self._ids.get(doc_key)
+                if doc_id is None:
+                    return False
+                self._conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+                self._conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                self._bump_version()
+            del self._ids[doc_key], self._docs[doc_id]
+            # a new array: searches already running keep their own snapshot
+            self._row_doc = np.where(self._row_doc == doc_id, -1, self._row_doc).astype(np.int32)
+            dead = int((self._row_doc < 0).sum())
+        if dead * 2 > len(self._row_doc):
+            self.compact()
+        return True
+
+    def compact(self):
+        """Rewrite the matrix without removed documents' rows and renumber the rest"""
+        with self._lock:
+            with self._conn:
+                # other processes wait for the new files before they add or reload
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._refresh()
+                keep = np.flatnonzero(self._row_doc >= 0)
+                if len(keep) == len(self._row_doc):
+                    return
+                suffix = f".tmp{os.getpid()}"
+                with open(self._path(".bin") + suffix, "wb") as f:
+                    for i in range(0, len(keep), 65536):
+                        f.write(np.ascontiguousarray(self._matrix[keep[i:i + 65536]]).tobytes())
+                if self._scales is not None:
+                    self._scales[keep].tofile(self._path(".scale") + suffix)
+                # ascending order: a row only ever moves down into a slot that is already free
+                self._conn.executemany("UPDATE passages SET row = ? WHERE row = ?",
+                                       [(new, int(old)) for new, old in enumerate(keep) if new != old])
+                self._conn.execute("INSERT OR REPLACE INTO settings VALUES ('rows', ?)", (str(len(keep)),))
+                self._bump_version()
+                self._matrix = None
+                os.replace(self._path(".bin") + suffix, self._path(".bin"))
+                if self._scales is not None:
+                    os.replace(self._path(".scale") + suffix, self._path(".scale"))
+                self._load(len(keep))
+
+    def search(self, query, top_k=CORPUS_TOP_K, doc_keys=None, per_document=None, block=4096):
+        """
+        Top-k chunks by cosine similarity to the query embedding, over all documents or just doc_keys,
+        best first as {"doc_key", "filename", "chunk", "text", "score"}. per_document caps the hits
+        taken from any one document so results spread across the library.
+        """
+        with self._lock:
+            self._refresh()
+            matrix, scales, row_doc, docs = self._matrix, self._scales, self._row_doc, self._docs
+            ids = None if doc_keys is None else [self._ids[k] for k in doc_keys if k in self._ids]
+        if matrix is None or (ids is not None and not ids):
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1)
+        rows = np.flatnonzero(row_doc >= 0 if ids is None else np.isin(row_doc, ids))
+        if not len(rows):
+            return []
+
+        scores = np.empty(len(rows), dtype=np.float32)
+        for i in range(0, len(rows), block):
+            r = rows[i:i + block]
+            # a contiguous run of rows is a plain slice of the memory map; otherwise gather them.
+            # Small blocks keep the int8 -> float32 copy in cache.
+            vecs = matrix[r[0]:r[-1] + 1] if r[-1] - r[0] + 1 == len(r) else matrix[r]
+            part = vecs.astype(np.float32, copy=False) @ q
+            scores[i:i + len(r)] = part * scales[r] if scales is not None else part
+
+        want = top_k if not per_document else min(len(rows), top_k * 8)
+        best = np.argpartition(-scores, want - 1)[:want] if len(rows) > want else np.arange(len(rows))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        hits, taken = [], {}
+        for i in best:
+            doc_id = int(row_doc[rows[i]])
+            if per_document and taken.get(doc_id, 0) >= per_document:
+                continue
+            taken[doc_id] = taken.get(doc_id, 0) + 1
+            hits.append((int(rows[i]), float(scores[i])))
+            if len(hits) == top_k:
+                break
+
+        with self._lock:
+            found = {row: (doc_id, chunk, text) for row, doc_id, chunk, text in self._conn.execute(
+                f"SELECT row, doc_id, chunk, text FROM passages WHERE row IN ({','.join('?' * len(hits))})",
+                [row for row, _ in hits])}
+        results = []
+        for row, score in hits:
+            if row in found and found[row][0] in docs:   # removed while we were scoring
+                doc_id, chunk, text = found[row]
+                results.append({"doc_key": docs[doc_id]["doc_key"], "filename": docs[doc_id]["filename"],
+                                "chunk": chunk, "text": text, "score": score})
+        return results
+
+    def usage(self):
+        with self._lock:
+            self._refresh()
+            rows = len(self._row_doc)
+            live = int((self._row_doc >= 0).sum())
+            row_bytes = (self.dim or 0) * self.dtype.itemsize + (4 if self.dtype == np.int8 else 0)
+            return {"documents": len(self._docs), "rows": live, "dead_rows": rows - live, "bytes": rows * row_bytes,
+                    "dtype": self.dtype.name}
+
+
+@st.cache_resource(show_spinner=False)
+def get_corpus():
+    """Document library shared by every session in this server process (None if EMBED_MODEL is empty)"""
+    if not EMBED_MODEL:
+        return None
+    return DocumentCorpus(os.path.join(DATA_DIR, "corpus"))
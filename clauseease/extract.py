@@ -0,0 +1,138 @@
+"""Reading uploads: DOCX parts streamed with iterparse, the PDF page pool, in-memory files."""
+import io
+import mimetypes
+import multiprocessing
+import os
+from xml.etree import ElementTree
+
+from .config import optional_import
+
+
+class ProcessingCancelled(Exception):
+    """Raised inside the pipeline when a document job's cancel event is set"""
+
+
+class ExtractionError(Exception):
+    """Raised while reading an upload; the message is shown to the user as-is"""
+
+
+# ---- Streaming DOCX extraction (WordprocessingML parts read with iterparse) ----
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DOCX_CONTAINERS = (_W + "body", _W + "hdr", _W + "ftr")
+
+
+def _docx_header_footer_parts(zf):
+    """Zip member names of the document's header and footer parts, in relationship order"""
+    headers, footers = [], []
+    try:
+        rels = ElementTree.fromstring(zf.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return headers, footers
+    for rel in rels.iter(_RELS + "Relationship"):
+        kind = rel.get("Type", "").rsplit("/", 1)[-1]
+        target = rel.get("Target", "")
+        name = target.lstrip("/") if target.startswith("/") else "word/" + target
+        if kind in ("header", "footer") and name in zf.NameToInfo:
+            (headers if kind == "header" else footers).append(name)
+    return headers, footers
+
+
+def _docx_paragraph_text(p):
+    """Text of a w:p: its runs' text, tabs and line breaks (deleted text and field codes are skipped)"""
+    parts = []
+    for run in p.iter(_W + "r"):
+        for el in run:
+            if el.tag == _W + "t":
+                parts.append(el.text or "")
+            elif el.tag == _W + "tab":
+                parts.append("\t")
+            elif el.tag in (_W + "br", _W + "cr"):
+                parts.append("\n")
+            elif el.tag == _W + "noBreakHyphen":
+                parts.append("-")
+    return "".join(parts)
+
+
+def _iter_docx_part(zf, name):
+    """
+    Yield the non-empty lines of one WordprocessingML part in document order: one per paragraph,
+    one per table row (cells joined with " | ", nested tables flattened into their cell).
+    """
+    stack = []
+    tables = 0          # depth of w:tbl nesting at the current position
+    fallback = 0        # inside mc:Fallback, which repeats the content of mc:Choice
+    with zf.open(name) as part:
+        for event, el in ElementTree.iterparse(part, events=("start", "end")):
+            if event == "start":
+                stack.append(el)
+                if el.tag == _W + "tbl":
+                    tables += 1
+                elif el.tag == _MC_FALLBACK:
+                    fallback += 1
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if el.tag == _MC_FALLBACK:
+                fallback -= 1
+                el.clear()
+            elif el.tag == _W + "p" and not tables:
+                text = _docx_paragraph_text(el) if not fallback else ""
+                el.clear()
+                if text.strip():
+                    yield text
+            elif el.tag == _W + "tbl":
+                tables -= 1
+            elif el.tag == _W + "tr" and tables == 1:
+                cells = [" ".join(t for t in (_docx_paragraph_text(p).strip() for p in tc.iter(_W + "p")) if t)
+                         for tc in el.findall(_W + "tc")]
+                el.clear()
+                parent.remove(el)
+                if any(cells):
+                    yield " | ".join(cells)
+            # finished top-level blocks leave the tree so it doesn't grow with the document
+            if parent is not None and parent.tag in _DOCX_CONTAINERS:
+                el.clear()
+                parent.remove(el)
+
+
+# ---- PDF page extraction on a process pool (module level so worker processes can find it) ----
+_pdf_worker_reader = None
+
+
+def _init_pdf_worker(raw):
+    global _pdf_worker_reader
+    _pdf_worker_reader = optional_import("PyPDF2", "PdfReader")(io.BytesIO(raw))
+
+
+def _extract_pdf_pages(page_range):
+    start, end = page_range
+    return [_pdf_worker_reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _pdf_pool_context():
+    # never fork: the Streamlit server is multi-threaded, and a forked child can inherit locks held
+    # by other threads. Workers start clean and import only this module and PyPDF2 (no Streamlit),
+    # once in the fork server rather than in every worker.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([__name__, "PyPDF2"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class DocumentFile(io.BytesIO):
+    """In-memory file with the UploadedFile attributes the pipeline uses (name, type, size)"""
+
+    def __init__(self, data, name, type=None):
+        super().__init__(data)
+        self.name = name
+        self.type = type or mimetypes.guess_type(name)[0] or ""
+        self.size = len(data)
+
+    @classmethod
+    def from_path(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read(), os.path.basename(path))
@@ -0,0 +1,133 @@
+"""Background document processing for the web UI."""
+import queue
+import threading
+import time
+import uuid
+
+import streamlit as st
+
+from .answers import get_prepared_answers
+from .config import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, JOB_RETENTION, JOB_WORKERS, SUMMARY_WORKERS
+from .extract import DocumentFile, ProcessingCancelled
+from .pipeline import ClauseEasePipeline
+
+
+class DocumentJob:
+    """One uploaded document queued for ClauseEasePipeline.process_document on a background worker"""
+
+    def __init__(self, uploaded_file, max_tokens, overlap_tokens, max_workers, chat_id=None):
+        self.id = uuid.uuid4().hex
+        self.filename = uploaded_file.name
+        self.chat_id = chat_id      # the chat it was uploaded in; the result goes there
+        # own copy of the bytes: the UploadedFile belongs to the script run that submitted the job
+        self.file = DocumentFile(uploaded_file.getvalue(), uploaded_file.name, uploaded_file.type)
+        self.params = {"max_tokens": max_tokens, "overlap_tokens": overlap_tokens, "max_workers": max_workers}
+        self.cancel_event = threading.Event()
+        self.status = "queued"      # queued -> running -> done | failed | cancelled
+        self.stage = "queued"
+        self.done = 0
+        self.total = 0              # None while the document is still being read (total not known yet)
+        self.submitted = time.time()
+        self.started = None
+        self.stage_started = None
+        self.finished = None
+        self.result = None
+        self.index = None
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def on_progress(self, stage, done, total):
+        if stage != self.stage:
+            self.stage_started = time.time()
+        self.stage, self.done, self.total = stage, done, total
+
+    def eta(self):
+        """Seconds left in the current stage, extrapolated from its progress so far"""
+        if self.status != "running" or not self.stage_started or not self.done or (self.total or 0) <= self.done:
+            return None
+        elapsed = time.time() - self.stage_started
+        return elapsed / self.done * (self.total - self.done)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class DocumentJobQueue:
+    """
+    FIFO of DocumentJobs served by a few daemon threads. Workers never touch st.session_state;
+    the submitting session polls job.status and applies job.result itself.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION):
+        self.pipeline = ClauseEasePipeline()
+        self.retention = retention
+        self.jobs = {}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        for i in range(max(1, workers)):
+            threading.Thread(target=self._work, name=f"clauseease-job-{i}", daemon=True).start()
+
+    def submit(self, uploaded_file, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+               max_workers=SUMMARY_WORKERS, chat_id=None):
+        job = DocumentJob(uploaded_file, max_tokens, overlap_tokens, max_workers, chat_id=chat_id)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def discard(self, job_id):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            job.status, job.finished = "cancelled", time.time()
+            return
+        job.status, job.stage, job.started = "running", "reading", time.time()
+        job.stage_started = job.started
+        try:
+            result = self.pipeline.process_document(job.file, on_progress=job.on_progress,
+                                                    cancel_event=job.cancel_event, **job.params)
+            if result["success"]:
+                job.index = self.pipeline.build_doc_index(result["chunk_texts"], result["chunk_summaries"])
+                result["corpus_error"] = self.pipeline.add_to_corpus(
+                    result, cancel_event=job.cancel_event,
+                    on_progress=lambda done, total: job.on_progress("embed", done, total))
+                get_prepared_answers().prepare(result["doc_key"], job.index, result["merged"])
+        except ProcessingCancelled:
+            result = {"success": False, "cancelled": True, "error": "Cancelled"}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        job.result = result
+        job.file = None
+        if result["success"]:
+            job.status = "done"
+        else:
+            job.status = "cancelled" if result.get("cancelled") else "failed"
+        job.finished = time.time()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """Background document workers shared by every session in this server process"""
+    return DocumentJobQueue()
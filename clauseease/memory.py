@@ -0,0 +1,158 @@
+"""Bounded in-memory stores for per-session values and shared document indexes."""
+import io
+import pickle
+import sys
+import threading
+import uuid
+import zlib
+from collections import OrderedDict, deque
+
+import streamlit as st
+
+from .config import DOC_INDEX_CACHE_MB, SESSION_MEMORY_MB, SESSION_STORE_MB
+
+
+class SessionBlobStore:
+    """
+    Compressed values owned by browser sessions, referenced from st.session_state by handle.
+    Values are pickled and zlib-compressed. The least recently used blobs are evicted once their
+    session holds more than session_bytes, or all sessions together more than max_bytes; get()
+    then returns None and the caller reloads the value from durable storage.
+    """
+
+    def __init__(self, session_bytes, max_bytes, level=6):
+        self.session_bytes = session_bytes
+        self.max_bytes = max_bytes
+        self.level = level
+        self.evictions = 0
+        self._blobs = OrderedDict()     # handle -> (owner, compressed, raw size), least recently used first
+        self._owned = {}                # owner -> compressed bytes
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def put(self, owner, value, handle=None):
+        """Store value (replacing handle's previous value, if given); returns the handle"""
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        blob = zlib.compress(raw, self.level)
+        with self._lock:
+            if handle is None:
+                handle = uuid.uuid4().hex
+            else:
+                self._drop(handle)
+            self._blobs[handle] = (owner, blob, len(raw))
+            self._owned[owner] = self._owned.get(owner, 0) + len(blob)
+            self._total += len(blob)
+            self._evict(owner)
+        return handle
+
+    def get(self, handle):
+        with self._lock:
+            entry = self._blobs.get(handle)
+            if entry is None:
+                return None
+            self._blobs.move_to_end(handle)
+        return pickle.loads(zlib.decompress(entry[1]))
+
+    def discard(self, handle):
+        with self._lock:
+            self._drop(handle)
+
+    def usage(self, owner=None):
+        """{"blobs", "bytes", "raw_bytes"} for one owner, or for every owner plus "sessions"/"evictions" """
+        with self._lock:
+            entries = [e for e in self._blobs.values() if owner is None or e[0] == owner]
+            usage = {"blobs": len(entries), "bytes": sum(len(e[1]) for e in entries),
+                     "raw_bytes": sum(e[2] for e in entries)}
+            if owner is None:
+                usage.update(sessions=len(self._owned), evictions=self.evictions)
+        return usage
+
+    def _drop(self, handle):
+        entry = self._blobs.pop(handle, None)
+        if entry is None:
+            return
+        owner, blob = entry[0], entry[1]
+        self._total -= len(blob)
+        self._owned[owner] -= len(blob)
+        if not self._owned[owner]:
+            del self._owned[owner]
+
+    def _evict(self, owner):
+        # the newest blob always stays, even when it alone is over budget
+        newest = next(reversed(self._blobs))
+        for handle in list(self._blobs):
+            if self._owned.get(owner, 0) <= self.session_bytes:
+                break
+            if handle != newest and self._blobs[handle][0] == owner:
+                self._drop(handle)
+                self.evictions += 1
+        # then the coldest blobs of any session
+        for handle in list(self._blobs):
+            if self._total <= self.max_bytes:
+                break
+            if handle != newest:
+                self._drop(handle)
+                self.evictions += 1
+
+
+@st.cache_resource(show_spinner=False)
+def get_session_blobs():
+    """Compressed per-session values shared by every session in this server process"""
+    return SessionBlobStore(int(SESSION_MEMORY_MB * 2 ** 20), int(SESSION_STORE_MB * 2 ** 20))
+
+
+class DocIndexCache:
+    """LexicalIndex per doc_key, shared by every session with that document open; LRU-bounded by estimated size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._indexes = OrderedDict()   # doc_key -> (index, bytes)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def get(self, doc_key):
+        with self._lock:
+            entry = self._indexes.get(doc_key)
+            if entry is None:
+                return None
+            self._indexes.move_to_end(doc_key)
+            return entry[0]
+
+    def put(self, doc_key, index):
+        size = index.nbytes()
+        with self._lock:
+            old = self._indexes.pop(doc_key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._indexes[doc_key] = (index, size)
+            self._total += size
+            while self._total > self.max_bytes and len(self._indexes) > 1:
+                _, (_, evicted) = self._indexes.popitem(last=False)
+                self._total -= evicted
+        return index
+
+    def usage(self):
+        with self._lock:
+            return {"indexes": len(self._indexes), "bytes": self._total}
+
+
+@st.cache_resource(show_spinner=False)
+def get_doc_index_cache():
+    """Document search indexes shared by every session in this server process"""
+    return DocIndexCache(int(DOC_INDEX_CACHE_MB * 2 ** 20))
+
+
+def estimate_size(obj, _seen=None):
+    """Approximate deep size in bytes of session data (containers, strings, NumPy arrays, plain objects)"""
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(estimate_size(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, (type, io.IOBase)):
+        size += estimate_size(vars(obj), seen)
+    return size
@@ -0,0 +1,260 @@
+"""Process-wide pipeline metrics, exported as Prometheus text and JSON."""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import streamlit as st
+
+from .config import DATA_DIR, METRICS_EXPORT_INTERVAL
+
+
+class TimedIterator:
+    """Wraps an iterator and accumulates the time spent producing its items in .seconds"""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+
+class PipelineMetrics:
+    """
+    Process-wide instrumentation: labelled counters, gauges and timing summaries
+    (count/sum/max plus quantiles over recent samples). Exported as Prometheus text
+    and as a JSON snapshot; collectors add gauges (e.g. cache stats) at export time.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+    HELP = {
+        "stage_seconds": "Time spent per document pipeline stage",
+        "model_request_seconds": "Ollama request latency (whole completion)",
+        "model_first_token_seconds": "Time to first streamed token",
+        "model_prompt_chars": "Prompt size sent to the model",
+        "model_response_chars": "Response size returned by the model",
+        "model_errors_total": "Failed model requests",
+        "model_retries_total": "Model requests retried after a transient failure",
+        "model_coalesced_total": "Model requests answered by an identical request already in flight",
+        "model_circuit_open": "1 while the model-server circuit breaker is open or half-open",
+        "canned_responses_total": "Quick-action lookups answered from (hit) or missing in (miss) the precomputed replies",
+        "prepared_answers_total": "Chat questions matching a standard question, answered from storage (hit) or not yet (pending, miss)",
+        "prepared_answer_errors_total": "Background standard-question answers abandoned after a model error",
+        "documents_total": "Documents processed",
+        "chunks_total": "Chunks produced",
+        "chunk_failures_total": "Chunks whose summary failed after retries",
+        "summary_dedup_hits_total": "Model calls avoided by reusing a near-duplicate chunk's summary",
+        "chunks_summarized_locally_total": "Low-value chunks (signatures, definitions, headings) summarized without the model",
+        "summary_cache_hits": "Summary cache hits since process start",
+        "summary_cache_misses": "Summary cache misses since process start",
+        "summary_cache_hit_ratio": "Summary cache hit ratio since process start",
+        "summary_cache_bytes": "Size of the summary cache",
+        "session_blob_bytes": "Compressed per-session values (summaries, long replies, conversations) held in memory",
+        "session_blob_evictions": "Per-session values evicted from memory since process start",
+        "doc_index_cache_bytes": "Estimated size of the shared document search indexes",
+        "session_memory_trims_total": "Sessions over their memory budget that let go of older loaded messages",
+        "corpus_search_seconds": "Document library similarity search latency (excluding the query embedding)",
+        "corpus_errors_total": "Processed documents that could not be added to the document library",
+        "corpus_documents": "Documents in the document library",
+        "corpus_rows": "Chunk embeddings in the document library",
+        "corpus_bytes": "Size of the document library's embedding matrix",
+    }
+
+    def __init__(self, max_samples=2048):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._collectors = []
+        self._max_samples = max_samples
+        self._last_export = 0.0
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            s = self._summaries.get(key)
+            if s is None:
+                s = self._summaries[key] = {"count": 0, "sum": 0.0, "max": 0.0, "samples": deque(maxlen=self._max_samples)}
+            s["count"] += 1
+            s["sum"] += value
+            s["max"] = max(s["max"], value)
+            s["samples"].append(value)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=name)
+
+    def add_collector(self, fn):
+        """fn() returns [(name, value, labels)] gauges, evaluated at export time"""
+        self._collectors.append(fn)
+
+    def _collect(self):
+        for fn in self._collectors:
+            try:
+                for name, value, labels in fn():
+                    self.set_gauge(name, value, **labels)
+            except Exception:
+                pass
+
+    def snapshot(self):
+        self._collect()
+        with self._lock:
+            summaries = []
+            for (name, labels), s in sorted(self._summaries.items()):
+                samples = np.fromiter(s["samples"], dtype=float)
+                row = {"name": name, "labels": dict(labels), "count": s["count"], "sum": s["sum"],
+                       "avg": s["sum"] / s["count"], "max": s["max"]}
+                for q in self.QUANTILES:
+                    row[f"p{int(q * 100)}"] = float(np.quantile(samples, q)) if samples.size else 0.0
+                summaries.append(row)
+            return {
+                "timestamp": datetime.now().isoformat(),
+                "uptime_s": round(time.time() - self.started, 3),
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())],
+                "gauges": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())],
+                "summaries": summaries,
+            }
+
+    def find(self, snapshot, kind, name, **labels):
+        """Look up one series in a snapshot (None if absent)"""
+        want = {k: str(v) for k, v in labels.items()}
+        for row in snapshot[kind]:
+            if row["name"] == name and all(row["labels"].get(k) == v for k, v in want.items()):
+                return row
+        return None
+
+    @staticmethod
+    def _escape_label(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    def to_prometheus(self, snapshot=None):
+        snap = snapshot or self.snapshot()
+
+        def fmt(name, labels, extra=None):
+            items = list(labels.items()) + (list(extra.items()) if extra else [])
+            inner = ",".join(f'{k}="{self._escape_label(v)}"' for k, v in items)
+            return f"clauseease_{name}{{{inner}}}" if inner else f"clauseease_{name}"
+
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self.HELP:
+                    lines.append(f"# HELP clauseease_{name} {self.HELP[name]}")
+                lines.append(f"# TYPE clauseease_{name} {kind}")
+
+        for row in snap["counters"]:
+            header(row["name"], "counter")
+            lines.append(f"{fmt(row['name'], row['labels'])} {row['value']}")
+        for row in snap["gauges"]:
+            header(row["name"], "gauge")
+            lines.append(f"{fmt(row['name'], row['labels'])} {row['value']}")
+        for row in snap["summaries"]:
+            header(row["name"], "summary")
+            for q in self.QUANTILES:
+                lines.append(f"{fmt(row['name'], row['labels'], {'quantile': q})} {row[f'p{int(q * 100)}']}")
+            lines.append(f"{fmt(row['name'] + '_sum', row['labels'])} {row['sum']}")
+            lines.append(f"{fmt(row['name'] + '_count', row['labels'])} {row['count']}")
+        lines.append(f"clauseease_uptime_seconds {snap['uptime_s']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=None):
+        """Write metrics.json and metrics.prom (atomically) for dashboards / node_exporter textfile"""
+        directory = directory or DATA_DIR
+        os.makedirs(directory, exist_ok=True)
+        snap = self.snapshot()
+        for name, content in (("metrics.json", json.dumps(snap, indent=2)), ("metrics.prom", self.to_prometheus(snap))):
+            path = os.path.join(directory, name)
+            tmp = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        self._last_export = time.time()
+
+    def maybe_export(self, interval=METRICS_EXPORT_INTERVAL):
+        if time.time() - self._last_export >= interval:
+            try:
+                self.export()
+            except OSError:
+                pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    """Metrics shared by every session in this server process"""
+    # the collected stores report through get_metrics themselves
+    from .corpus import get_corpus
+    from .memory import get_doc_index_cache, get_session_blobs
+    from .ollama import get_ollama_client
+    from .stores import get_summary_cache
+
+    metrics = PipelineMetrics()
+
+    def cache_stats():
+        stats = get_summary_cache().stats()
+        return [
+            ("summary_cache_hits", stats["hits"], {}),
+            ("summary_cache_misses", stats["misses"], {}),
+            ("summary_cache_hit_ratio", round(stats["hit_rate"], 4), {}),
+            ("summary_cache_bytes", stats["size_bytes"], {}),
+        ]
+
+    def breaker_state():
+        return [("model_circuit_open", int(get_ollama_client().breaker.state != "closed"), {})]
+
+    def memory_stats():
+        blobs = get_session_blobs().usage()
+        return [
+            ("session_blob_bytes", blobs["bytes"], {}),
+            ("session_blob_evictions", blobs["evictions"], {}),
+            ("doc_index_cache_bytes", get_doc_index_cache().usage()["bytes"], {}),
+        ]
+
+    def corpus_stats():
+        corpus = get_corpus()
+        if corpus is None:
+            return []
+        usage = corpus.usage()
+        return [
+            ("corpus_documents", usage["documents"], {}),
+            ("corpus_rows", usage["rows"], {}),
+            ("corpus_bytes", usage["bytes"], {}),
+        ]
+
+    metrics.add_collector(cache_stats)
+    metrics.add_collector(breaker_state)
+    metrics.add_collector(memory_stats)
+    metrics.add_collector(corpus_stats)
+    return metrics
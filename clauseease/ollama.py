@@ -0,0 +1,326 @@
+"""Client for the local Ollama server, with retries, a circuit breaker and request coalescing."""
+import hashlib
+import json
+import random
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+from .config import (
+    BREAKER_COOLDOWN, BREAKER_FAILURES, EMBED_MODEL, MAX_INFLIGHT, MODEL_BACKOFF, MODEL_KEEP_ALIVE, MODEL_NAME,
+    MODEL_RETRIES, MODEL_TIMEOUT, OLLAMA_URL,
+)
+from .metrics import get_metrics
+
+
+class OllamaError(Exception):
+    """Raised by OllamaClient when the model server fails or returns an error"""
+
+
+class OllamaConnectionError(OllamaError):
+    """The model server could not be reached at all (reported separately from API errors)"""
+
+
+class OllamaUnavailableError(OllamaError):
+    """The model server answered but is temporarily failing (timeout, HTTP 429/5xx); worth retrying"""
+
+
+class CircuitOpenError(OllamaConnectionError):
+    """Raised without contacting the server while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed: requests pass. After max_failures transient failures in a row it opens and
+    check() fails fast for cooldown seconds; then it is half-open and lets one trial request
+    through, whose outcome closes or re-opens it.
+    """
+
+    def __init__(self, max_failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < self.cooldown else "half-open"
+
+    def check(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._trial:
+                raise CircuitOpenError(f"Ollama is unavailable; not retrying for {max(remaining, 0):.0f}s")
+            self._trial = True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.max_failures and self.failures >= self.max_failures):
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class _Flight:
+    """One upstream generation whose tokens are shared by every identical concurrent request"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.tokens = []
+        self.final = None
+        self.error = None
+        self.done = False
+
+    def push(self, token):
+        with self.cond:
+            self.tokens.append(token)
+            self.cond.notify_all()
+
+    def land(self, final=None, error=None):
+        with self.cond:
+            self.final, self.error, self.done = final, error, True
+            self.cond.notify_all()
+
+    def follow(self):
+        """Yield the shared tokens as they arrive; re-raises the leader's error"""
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.tokens) and not self.done:
+                    self.cond.wait()
+                batch = self.tokens[i:]
+                finished = self.done
+            yield from batch
+            i += len(batch)
+            if finished and i >= len(self.tokens):
+                break
+        if self.error is not None:
+            raise self.error
+
+
+class OllamaClient:
+    """
+    Reusable client for the local Ollama server.
+    Keeps one pooled keep-alive requests.Session so chat turns and chunk summaries reuse
+    connections, and can stream tokens from /api/generate as they are produced.
+    Identical concurrent requests (same prompt, context and mode) share one upstream call;
+    transient failures are retried with jittered backoff behind a circuit breaker.
+    """
+
+    def __init__(self, base_url=OLLAMA_URL, model=MODEL_NAME, timeout=MODEL_TIMEOUT, pool_size=MAX_INFLIGHT,
+                 keep_alive=MODEL_KEEP_ALIVE, retries=MODEL_RETRIES, backoff=MODEL_BACKOFF):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker()
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        # caps concurrent document-summary calls across every session sharing this client
+        self.slots = threading.BoundedSemaphore(max(1, pool_size))
+
+        import requests
+        self.session = requests.Session()
+        # one host, so a single pool sized for the summary workers plus a chat request
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size) + 1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, prompt, stream, context=None, path="/api/generate", payload=None):
+        """_post_once with retries of transient failures, gated by the circuit breaker"""
+        if payload is None:
+            payload = {"model": self.model, "prompt": prompt, "stream": stream, "keep_alive": self.keep_alive}
+            if context:
+                payload["context"] = context
+        attempt = 0
+        while True:
+            self.breaker.check()
+            try:
+                response = self._post_once(path, payload, stream)
+            except (OllamaConnectionError, OllamaUnavailableError):
+                self.breaker.failure()
+                if attempt >= self.retries or self.breaker.state != "closed":
+                    raise
+                attempt += 1
+                get_metrics().inc("model_retries_total")
+                # full jitter: concurrent callers don't retry in lockstep
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                continue
+            except OllamaError:
+                self.breaker.success()  # the server answered; the request itself was bad
+                raise
+            self.breaker.success()
+            return response
+
+    def _post_once(self, path, payload, stream):
+        import requests
+        try:
+            response = self.session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                timeout=self.timeout,
+                stream=stream,
+            )
+        except requests.exceptions.ConnectionError as e:
+            # "server down" gets its own type so callers can report it separately
+            raise OllamaConnectionError(str(e)) from e
+        except requests.exceptions.Timeout as e:
+            raise OllamaUnavailableError(f"Ollama API Error: timed out ({e})") from e
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(str(e)) from e
+
+        if response.status_code != 200:
+            text = response.text
+            response.close()
+            error = OllamaUnavailableError if response.status_code == 429 or response.status_code >= 500 else OllamaError
+            raise error(f"Ollama API Error: {response.status_code} - {text}")
+        return response
+
+    def warm_up(self):
+        """Have Ollama load the model now and keep it for keep_alive (an empty prompt only loads it)"""
+        self._post("", stream=False).close()
+
+    def embed(self, texts, model=EMBED_MODEL):
+        """Embedding vectors for texts, one list of floats per text (/api/embed, or /api/embeddings on older servers)"""
+        payload = {"model": model, "input": list(texts), "keep_alive": self.keep_alive}
+        try:
+            response = self._post(None, stream=False, path="/api/embed", payload=payload)
+        except OllamaError as e:
+            if " 404 " not in str(e) or "model" in str(e).lower():
+                raise
+            vectors = []
+            for text in texts:
+                response = self._post(None, stream=False, path="/api/embeddings",
+                                      payload={"model": model, "prompt": text, "keep_alive": self.keep_alive})
+                try:
+                    vectors.append(response.json()["embedding"])
+                finally:
+                    response.close()
+            return vectors
+        try:
+            return response.json()["embeddings"]
+        finally:
+            response.close()
+
+    def _join(self, prompt, stream, context):
+        """(flight, is_leader) for this request; followers share the leader's upstream call"""
+        h = hashlib.sha256(f"{self.model}\0{int(stream)}\0{prompt}".encode("utf-8"))
+        if context:
+            h.update(np.asarray(context, dtype=np.int64).tobytes())
+        key = h.hexdigest()
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                get_metrics().inc("model_coalesced_total")
+                return key, flight, False
+            flight = self._flights[key] = _Flight()
+            return key, flight, True
+
+    def _land(self, key, flight, final=None, error=None):
+        with self._flights_lock:
+            self._flights.pop(key, None)
+        flight.land(final, error)
+
+    @staticmethod
+    def parse_response(data):
+        """Pull the completion text out of the common response shapes"""
+        if isinstance(data, dict):
+            # common key "response"
+            if "response" in data:
+                return data["response"]
+            # sometimes it's {"choices": [{"text": "..."}]}
+            if "choices" in data and isinstance(data["choices"], list) and len(data["choices"]) > 0:
+                c = data["choices"][0]
+                return c.get("text") or c.get("message") or str(c)
+        return str(data)
+
+    def generate(self, prompt, context=None, on_done=None):
+        """
+        Blocking generation; returns the full completion text.
+        context continues an earlier conversation (Ollama's "context" from its last reply);
+        on_done(data) receives the final response object, which carries the new context.
+        """
+        key, flight, leader = self._join(prompt, False, context)
+        if leader:
+            try:
+                response = self._post(prompt, stream=False, context=context)
+                try:
+                    data = response.json()
+                finally:
+                    response.close()
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            flight.push(self.parse_response(data))
+            self._land(key, flight, final=data)
+        else:
+            "".join(flight.follow())
+            data = flight.final
+        if on_done and isinstance(data, dict):
+            on_done(data)
+        return self.parse_response(data)
+
+    def stream(self, prompt, context=None, on_done=None):
+        """Yield completion tokens as Ollama produces them (NDJSON, one object per line); see generate"""
+        key, flight, leader = self._join(prompt, True, context)
+        if not leader:
+            yield from flight.follow()
+            if on_done and flight.final:
+                on_done(flight.final)
+            return
+
+        final, error = None, None
+        try:
+            response = self._post(prompt, stream=True, context=context)
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise OllamaError(f"Ollama API Error: {data['error']}")
+                    token = data.get("response")
+                    if token:
+                        flight.push(token)
+                        yield token
+                    if data.get("done"):
+                        final = data
+                        break
+            finally:
+                response.close()
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if error is None and final is None:
+                # the caller stopped reading early: followers can't get the rest of this reply
+                error = OllamaError("Ollama API Error: shared request ended early")
+            self._land(key, flight, final=final, error=error)
+        if on_done and final:
+            on_done(final)
+
+
+@st.cache_resource(show_spinner=False)
+def get_ollama_client():
+    """One pooled client per server process"""
+    return OllamaClient()
@@ -0,0 +1,738 @@
+"""The document pipeline (extract, chunk, summarize, merge) and chat prompts, independent of the UI."""
+import random
+import sqlite3
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from xml.etree import ElementTree
+
+import numpy as np
+
+from .config import (
+    CHUNK_OVERLAP_TOKENS, CHUNK_PROMPT_TEMPLATE, CHUNK_TOKENS, CONTEXT_TOKEN_BUDGET, CONTEXT_TOP_K, EMBED_BATCH,
+    PDF_POOL_BATCH_PAGES, PDF_POOL_MIN_PAGES, PDF_POOL_WORKERS, REDUCE_GROUP_SIZE, REDUCE_PROMPT_TEMPLATE,
+    SUMMARY_RETRIES, SUMMARY_TARGET_CHARS, SUMMARY_WORKERS, optional_import,
+)
+from .corpus import get_corpus
+from .extract import (
+    ExtractionError, ProcessingCancelled, _docx_header_footer_parts, _extract_pdf_pages, _init_pdf_worker,
+    _iter_docx_part, _pdf_pool_context,
+)
+from .metrics import TimedIterator, get_metrics
+from .ollama import CircuitOpenError, OllamaConnectionError, OllamaError, get_ollama_client
+from .stores import get_chunk_store, get_dedup_index, get_summary_cache
+from .text import (
+    _ABBREVIATIONS, _HEADING_RE, _UNIT_END_RE, ClauseTagger, LexicalIndex, estimate_tokens, get_clause_tagger,
+    get_glossary_matcher,
+)
+
+
+class ClauseEasePipeline:
+    """
+    Extraction, chunking and summarization, independent of Streamlit.
+    The Streamlit app (clauseease_chatbot.py) builds the UI on top of it; clauseease_batch.py runs it headless.
+    """
+
+    def simplify_text(self, text):
+        """Simplify contract text with enhanced processing (one pass over the text, see GlossaryMatcher)"""
+        return get_glossary_matcher().replace(text)
+
+    def get_response(self, user_input, on_token=None, context=None, on_done=None):
+        """
+        Generate chatbot response using local Llama 3.2 model via Ollama.
+        With on_token, the reply is streamed and on_token(text_so_far) is called as tokens arrive.
+        context/on_done carry a conversation across calls (see OllamaClient.generate).
+        """
+        client = get_ollama_client()
+        metrics = get_metrics()
+        mode = "generate" if on_token is None else "stream"
+        metrics.observe("model_prompt_chars", len(user_input), mode=mode)
+        start = time.perf_counter()
+
+        def done(data):
+            # tokens the model had to evaluate for this prompt; drops sharply when context is reused
+            if data.get("prompt_eval_count") is not None:
+                metrics.observe("model_prompt_eval_tokens", data["prompt_eval_count"], mode=mode)
+            if on_done:
+                on_done(data)
+
+        try:
+            if on_token is None:
+                response = client.generate(user_input, context=context, on_done=done)
+            else:
+                parts = []
+                for token in client.stream(user_input, context=context, on_done=done):
+                    if not parts:
+                        metrics.observe("model_first_token_seconds", time.perf_counter() - start)
+                    parts.append(token)
+                    on_token("".join(parts))
+                response = "".join(parts)
+
+            metrics.observe("model_request_seconds", time.perf_counter() - start, mode=mode)
+            metrics.observe("model_response_chars", len(response), mode=mode)
+            return response
+
+        except CircuitOpenError as e:
+            metrics.inc("model_errors_total", kind="circuit_open")
+            return f" Cannot connect to Ollama ({e}). Please ensure Ollama is running (`ollama serve`)."
+
+        except OllamaConnectionError:
+            metrics.inc("model_errors_total", kind="connection")
+            return " Cannot connect to Ollama. Please ensure Ollama is running (`ollama serve`)."
+
+        except OllamaError as e:
+            metrics.inc("model_errors_total", kind="api")
+            return f" {str(e)}"
+
+        except Exception as e:
+            metrics.inc("model_errors_total", kind="other")
+            return f" Error generating response: {str(e)}"
+
+        finally:
+            metrics.maybe_export()
+
+    # ------------------- extraction, chunking, chunk store, send-to-model -------------------
+    def iter_text_blocks(self, uploaded_file):
+        """
+        Yield the text of an uploaded file block by block (one page at a time for PDFs), so
+        chunking and summarization can start before the whole document has been read.
+        Supports txt, pdf, docx. Raises ExtractionError with a user-facing message.
+        """
+        name_lower = (uploaded_file.name or "").lower()
+        ctype = (uploaded_file.type or "").lower()
+
+        # TXT
+        if "text" in ctype or name_lower.endswith(".txt"):
+            raw = uploaded_file.read()
+            try:
+                yield raw.decode("utf-8")
+            except UnicodeDecodeError:
+                yield raw.decode("latin-1", errors="ignore")
+            return
+
+        # PDF
+        if "pdf" in ctype or name_lower.endswith(".pdf"):
+            PdfReader = optional_import("PyPDF2", "PdfReader")
+            if PdfReader is None:
+                raise ExtractionError("[PDF extractor not available: PyPDF2 not installed]")
+            try:
+                reader = PdfReader(uploaded_file)
+                page_count = len(reader.pages)
+                if PDF_POOL_MIN_PAGES and page_count >= PDF_POOL_MIN_PAGES and PDF_POOL_WORKERS > 1:
+                    yield from self._iter_pdf_pages_pooled(uploaded_file, page_count)
+                    return
+                for p in reader.pages:
+                    page_text = p.extract_text()
+                    if page_text:
+                        yield page_text + "\n"
+            except ExtractionError:
+                raise
+            except Exception as e:
+                raise ExtractionError(f"[PDF extraction error] {str(e)}")
+            return
+
+        # DOCX
+        if name_lower.endswith(".docx") or "word" in ctype or name_lower.endswith(".doc"):
+            try:
+                yield from self._iter_docx_blocks(uploaded_file)
+            except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+                raise ExtractionError(f"[DOCX extraction error] {str(e)}")
+            return
+
+        raise ExtractionError("[Unsupported file type]")
+
+    def _iter_pdf_pages_pooled(self, uploaded_file, page_count):
+        """Extract page batches on worker processes, yielding pages in order as batches finish"""
+        uploaded_file.seek(0)
+        raw = uploaded_file.read()
+        batches = [(i, min(i + PDF_POOL_BATCH_PAGES, page_count)) for i in range(0, page_count, PDF_POOL_BATCH_PAGES)]
+        with ProcessPoolExecutor(max_workers=PDF_POOL_WORKERS, mp_context=_pdf_pool_context(),
+                                 initializer=_init_pdf_worker, initargs=(raw,)) as pool:
+            # map() yields results in submission order while later batches are still running
+            for pages in pool.map(_extract_pdf_pages, batches):
+                for page_text in pages:
+                    if page_text:
+                        yield page_text + "\n"
+
+    def _iter_docx_blocks(self, uploaded_file, block_chars=8192):
+        """
+        Stream a .docx without building its object model: headers, then word/document.xml
+        paragraphs and table rows in document order, then footers. Parts are read straight from
+        the zip with iterparse and each finished paragraph/row is dropped from the tree, so memory
+        stays flat however long the document is. Text is yielded in blocks of ~block_chars.
+        """
+        uploaded_file.seek(0)
+        with zipfile.ZipFile(uploaded_file) as zf:
+            headers, footers = _docx_header_footer_parts(zf)
+            buf = []
+            size = 0
+            seen = set()
+            for name, repeated in [(n, True) for n in headers] + [("word/document.xml", False)] + [(n, True) for n in footers]:
+                for line in _iter_docx_part(zf, name):
+                    if repeated:
+                        # first-page/even/default headers usually say the same thing
+                        if line in seen:
+                            continue
+                        seen.add(line)
+                    buf.append(line + "\n")
+                    size += len(line) + 1
+                    if size >= block_chars:
+                        yield "".join(buf)
+                        buf = []
+                        size = 0
+            if buf:
+                yield "".join(buf)
+
+    def extract_text_from_file(self, uploaded_file):
+        """
+        Extract text from uploaded file content. Supports txt, pdf, docx.
+        """
+        try:
+            try:
+                return "".join(self.iter_text_blocks(uploaded_file))
+            finally:
+                # ensure we can re-read this file later by rewinding
+                try:
+                    uploaded_file.seek(0)
+                except Exception:
+                    pass
+        except ExtractionError as e:
+            return str(e)
+        except Exception as ex:
+            return f"[Extraction failed] {str(ex)}"
+
+    def split_units(self, text):
+        """
+        Split text into sentence/clause units as [(start, end, hard)] offsets covering the text.
+        hard is True when the unit is followed by a paragraph break or a section heading,
+        i.e. a place where a chunk should preferably end.
+        """
+        units = []
+        pos = 0
+        for m in _UNIT_END_RE.finditer(text):
+            end = m.end()
+            if end <= pos or end >= len(text):
+                continue
+            if text[m.start()] == ".":
+                # "Inc. ", "No. 5", "e.g. " are not sentence ends
+                word = text[max(pos, m.start() - 5):m.start()].rsplit(None, 1)[-1:] or [""]
+                if word[0].lower().lstrip("(") in _ABBREVIATIONS:
+                    continue
+            sep = m.group()
+            hard = sep.count("\n") >= 2 or ("\n" in sep and _HEADING_RE.match(text, end) is not None)
+            units.append((pos, end, hard))
+            pos = end
+        if pos < len(text):
+            units.append((pos, len(text), True))
+        return units
+
+    def _split_oversized(self, text, units, max_chars):
+        """Cut units longer than max_chars at a comma, else at whitespace"""
+        out = []
+        for start, end, hard in units:
+            while end - start > max_chars:
+                limit = start + max_chars
+                cut = text.rfind(", ", start, limit)
+                if cut > start + max_chars // 2:
+                    cut += 2
+                else:
+                    cut = text.rfind(" ", start, limit) + 1
+                    if cut <= start + max_chars // 2:
+                        cut = limit
+                out.append((start, cut, False))
+                start = cut
+            out.append((start, end, hard))
+        return out
+
+    def chunk_spans(self, text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        """
+        Clause-aware chunker. Returns [(start, end)] offsets into text rather than copies.
+        Chunks are packed from whole sentences/clauses up to max_tokens (estimated model
+        tokens), end at a paragraph or section break when one falls in the second half of
+        the chunk, and repeat up to overlap_tokens of trailing sentences at the start of
+        the next chunk (never across a section break). Original whitespace is preserved.
+        """
+        if not text or not text.strip():
+            return []
+        max_chars = max(max_tokens, 1) * 4
+        overlap_chars = max(overlap_tokens, 0) * 4
+        units = self._split_oversized(text, self.split_units(text), max_chars)
+
+        spans = []
+        i = 0
+        n = len(units)
+        while i < n:
+            start = units[i][0]
+            j = i + 1
+            while j < n and units[j][1] - start <= max_chars:
+                j += 1
+            # prefer ending on a paragraph/section boundary in the second half of the chunk
+            for k in range(j, i + 1, -1):
+                if units[k - 1][2] and units[k - 1][1] - start >= max_chars // 2:
+                    j = k
+                    break
+
+            s, e = start, units[j - 1][1]
+            while s < e and text[s].isspace():
+                s += 1
+            while e > s and text[e - 1].isspace():
+                e -= 1
+            if e > s:
+                spans.append((s, e))
+
+            if j >= n:
+                break
+            # step back over trailing units for overlap, always making progress
+            next_i = j
+            if overlap_chars and not units[j - 1][2]:
+                while next_i - 1 > i and units[j - 1][1] - units[next_i - 1][0] <= overlap_chars:
+                    next_i -= 1
+            i = next_i
+        return spans
+
+    def chunk_text(self, text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        """Chunks as strings (see chunk_spans)"""
+        return [text[s:e] for s, e in self.chunk_spans(text, max_tokens, overlap_tokens)]
+
+    def iter_chunks(self, blocks, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        """
+        Incremental chunk_spans over a stream of text blocks. Yields (start, end, chunk)
+        with offsets into "".join(blocks) as soon as a chunk can no longer change, keeping
+        only the unfinished tail of the text in memory.
+        """
+        buf = ""
+        base = 0
+        window = max(max_tokens, 1) * 4 * 3
+        for block in blocks:
+            if not block:
+                continue
+            buf += block
+            if len(buf) < window:
+                continue
+            spans = self.chunk_spans(buf, max_tokens, overlap_tokens)
+            # the last chunk may still grow with the next block; re-chunk from its start
+            for s, e in spans[:-1]:
+                yield base + s, base + e, buf[s:e]
+            if len(spans) > 1:
+                keep = spans[-1][0]
+                buf = buf[keep:]
+                base += keep
+        for s, e in self.chunk_spans(buf, max_tokens, overlap_tokens):
+            yield base + s, base + e, buf[s:e]
+
+    def build_chunk_prompt(self, chunk, idx, total=None, prompt_template=CHUNK_PROMPT_TEMPLATE):
+        """Short summarization prompt for one chunk (total is unknown while a document is still streaming in)"""
+        position = f"{idx + 1}/{total}" if total else f"{idx + 1}"
+        return prompt_template.format(position=position, chunk=chunk)
+
+    def is_error_response(self, text):
+        """get_response reports failures as text; detect them so a chunk can be retried"""
+        if not text or not text.strip():
+            return True
+        return text.startswith((" Ollama API Error", " Cannot connect to Ollama", " Error generating response"))
+
+    def summarize_chunk(self, prompt, retries=SUMMARY_RETRIES):
+        """
+        Summarize one chunk, retrying failed calls with backoff.
+        Returns (summary, error) - exactly one of them is None.
+        """
+        attempt = 0
+        while True:
+            # process-wide cap on concurrent model calls
+            with get_ollama_client().slots:
+                summary = self.get_response(prompt)
+            if not self.is_error_response(summary):
+                return summary, None
+            # the client already retried transient failures; don't wait out an open circuit
+            if attempt >= retries or get_ollama_client().breaker.state == "open":
+                return None, (summary or "").strip() or "No summary returned"
+            attempt += 1
+            time.sleep(random.uniform(0.5, 1.0) * min(2 ** attempt, 10))
+
+    def summarize_chunks(self, chunks, max_workers=SUMMARY_WORKERS, retries=SUMMARY_RETRIES, on_progress=None,
+                         prompt_template=CHUNK_PROMPT_TEMPLATE, cancel_event=None, dedupe=True, tagger=None):
+        """
+        Summarize chunks concurrently on a bounded thread pool.
+        chunks may be a list or any iterable (e.g. a generator fed by page-wise extraction):
+        each chunk is submitted as soon as it arrives, so the model is busy while later
+        pages are still being parsed.
+        prompt_template is formatted with position/chunk and is part of the cache key.
+        Chunks already in the summary cache are answered from disk. With dedupe, a near-duplicate
+        of a chunk already summarized (or being summarized) reuses that summary (see
+        NearDuplicateIndex); only the rest reach the model.
+        With a tagger (ClauseTagger), each chunk is tagged with clause types first: low-value chunks
+        are summarized locally and the others use a prompt focused on their clause types.
+        Results are returned in chunk order as {"index", "summary", "error", "cached", "deduped",
+        "local", "tags", "seconds"} (seconds = model time including retries); a failed chunk keeps
+        its error instead of aborting the whole document.
+        on_progress(done, total) is called from the calling thread, so it may touch Streamlit;
+        total is None while chunks are still arriving from an iterable. Setting cancel_event raises
+        ProcessingCancelled.
+        """
+        total = len(chunks) if isinstance(chunks, (list, tuple)) else None
+        cache = get_summary_cache()
+        dedup_index = get_dedup_index() if dedupe else None
+        results = []
+        futures = {}
+        keys = {}
+        prompts = {}
+        tags = {}
+        in_flight = {}      # cache key -> index of the chunk being summarized under it
+        followers = {}      # index -> near-duplicate chunk indexes waiting for its summary
+        done = 0
+
+        def timed(prompt):
+            start = time.perf_counter()
+            summary, error = self.summarize_chunk(prompt, retries)
+            return summary, error, time.perf_counter() - start
+
+        def submit(idx):
+            futures[pool.submit(timed, prompts.pop(idx))] = idx
+
+        def reuse(idx, summary):
+            cache.put(keys[idx], summary)
+            results[idx] = {"index": idx, "summary": summary, "error": None, "cached": False, "deduped": True,
+                            "local": False, "tags": tags[idx], "seconds": 0.0}
+
+        def finish(fut):
+            """Record one finished model call; returns how many chunks it completed"""
+            idx = futures.pop(fut)
+            in_flight.pop(keys[idx], None)
+            try:
+                summary, error, seconds = fut.result()
+            except Exception as e:
+                summary, error, seconds = None, str(e), None
+            if summary is not None:
+                cache.put(keys[idx], summary)
+            results[idx] = {"index": idx, "summary": summary or f"[Summary failed: {error}]", "error": error,
+                            "cached": False, "deduped": False, "local": False, "tags": tags[idx], "seconds": seconds}
+            completed = 1
+            for other in followers.pop(idx, ()):
+                if summary is not None:
+                    reuse(other, summary)
+                    completed += 1
+                else:
+                    submit(other)   # the chunk it resembled failed: summarize it on its own
+            return completed
+
+        def check_cancel():
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessingCancelled()
+
+        pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="clauseease-summary")
+        cancelled = False
+        try:
+            for idx, ch in enumerate(chunks):
+                check_cancel()
+                template = prompt_template
+                local = None
+                tags[idx] = []
+                if tagger is not None:
+                    tags[idx] = tagger.tag(ch)
+                    local = tagger.local_summary(ch, tags[idx])
+                    template = tagger.prompt_template(tags[idx], prompt_template)
+                if local is not None:
+                    results.append({"index": idx, "summary": local, "error": None, "cached": False, "deduped": False,
+                                    "local": True, "tags": tags[idx], "seconds": 0.0})
+                    done += 1
+                    if on_progress:
+                        on_progress(done, total)
+                    continue
+
+                key = keys[idx] = cache.make_key(ch, template=template)
+                summary = cache.get(key)
+                fingerprint = dedup_index.fingerprint(ch) if dedup_index is not None else None
+                if summary is not None:
+                    results.append({"index": idx, "summary": summary, "error": None, "cached": True, "deduped": False,
+                                    "local": False, "tags": tags[idx], "seconds": 0.0})
+                    done += 1
+                else:
+                    results.append(None)
+                    prompts[idx] = self.build_chunk_prompt(ch, idx, total, template)
+                    similar = dedup_index.query(fingerprint) if fingerprint is not None else None
+                    similar_summary = cache.peek(similar) if similar is not None else None
+                    if similar_summary is not None:
+                        del prompts[idx]
+                        reuse(idx, similar_summary)
+                        done += 1
+                    elif similar in in_flight:
+                        followers.setdefault(in_flight[similar], []).append(idx)
+                    else:
+                        in_flight[key] = idx
+                        submit(idx)
+                if fingerprint is not None:
+                    dedup_index.add(key, fingerprint)
+
+                # collect whatever finished while this chunk was being produced
+                for fut in [f for f in futures if f.done()]:
+                    done += finish(fut)
+                if on_progress:
+                    on_progress(done, total)
+
+            # every chunk has arrived: from here progress is against the real total
+            total = len(results)
+            if on_progress:
+                on_progress(done, total)
+            while futures:
+                # short waits so a cancel request is noticed while model calls are in flight
+                finished, _ = wait(list(futures), timeout=0.5, return_when=FIRST_COMPLETED)
+                check_cancel()
+                for fut in finished:
+                    done += finish(fut)
+                if finished and on_progress:
+                    on_progress(done, total)
+        except ProcessingCancelled:
+            cancelled = True
+            raise
+        finally:
+            # on cancel, drop queued chunks and don't wait for the calls already running
+            pool.shutdown(wait=not cancelled, cancel_futures=cancelled)
+
+        return results
+
+    def reduce_summaries(self, chunk_summaries, group_size=REDUCE_GROUP_SIZE, target_chars=SUMMARY_TARGET_CHARS,
+                         max_workers=SUMMARY_WORKERS, on_progress=None, cancel_event=None):
+        """
+        Hierarchical merge of chunk summaries.
+        Level 0 holds one entry per chunk; each further level merges groups of group_size
+        entries of the level below (concurrently, through the same pool/cache as chunks)
+        until the whole level fits target_chars. Every entry records the chunk range it
+        covers as {"summary", "first", "last"}; all levels are returned, top level last.
+        Level 0 entries also say whether the chunk's summary "failed" (its summary is then the error).
+        on_progress(level, done, total) is called from the calling thread.
+        """
+        group_size = max(2, group_size)
+        level = [{"summary": c["summary"], "first": c["index"], "last": c["index"], "failed": bool(c["error"])}
+                 for c in chunk_summaries]
+        levels = [level]
+
+        def size(entries):
+            return sum(len(e["summary"]) for e in entries)
+
+        while len(level) > 1 and size(level) > target_chars:
+            groups = [level[i:i + group_size] for i in range(0, len(level), group_size)]
+            texts = [
+                "\n\n".join(f"Chunks {e['first']+1}-{e['last']+1}:\n{e['summary']}" for e in group)
+                for group in groups
+            ]
+            depth = len(levels)
+            merged = self.summarize_chunks(
+                texts, max_workers=max_workers, prompt_template=REDUCE_PROMPT_TEMPLATE, cancel_event=cancel_event,
+                dedupe=False,
+                on_progress=(lambda done, total: on_progress(depth, done, total)) if on_progress else None,
+            )
+            level = []
+            for group, text, m in zip(groups, texts, merged):
+                # a failed merge keeps the group's own summaries rather than losing them
+                level.append({"summary": text if m["error"] else m["summary"],
+                              "first": group[0]["first"], "last": group[-1]["last"]})
+            levels.append(level)
+
+        return levels
+
+    def format_summary_level(self, level):
+        """Readable text for one level of reduce_summaries output"""
+        parts = []
+        for e in level:
+            label = f"Chunk {e['first']+1}" if e["first"] == e["last"] else f"Chunks {e['first']+1}-{e['last']+1}"
+            parts.append(f"{label} summary:\n{e['summary']}")
+        return "\n\n".join(parts)
+
+    def build_doc_index(self, chunks, chunk_summaries):
+        """Index each chunk together with its summary so chat questions can pull just the relevant parts"""
+        passages = []
+        for ch, c in zip(chunks, chunk_summaries):
+            summary = c["summary"] if not c["error"] else ""
+            passages.append({
+                "index": c["index"],
+                "text": f"[Chunk {c['index']+1}]\n{ch}",
+                "search_text": f"{summary}\n{ch}",
+                "fallback": f"[Chunk {c['index']+1} summary]\n{summary}" if summary else None,
+            })
+        return LexicalIndex(passages)
+
+    def document_prompt(self, user_input, index, doc_ctx, top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET,
+                        sent=None):
+        """
+        Prompt for a question about one document: the passages of index most relevant to it (bounded
+        by token_budget), not the whole merged summary doc_ctx. sent holds the passage ids the model
+        already has from earlier turns of a continued conversation; those and the overview are not repeated.
+        Returns (prompt, ids of the passages attached).
+        """
+        continuing = sent is not None
+        if index is not None and len(index):
+            # a short whole-document overview (top reduce level) when it takes at most a third of the budget
+            overview = ""
+            if not continuing and doc_ctx and estimate_tokens(doc_ctx) <= token_budget // 3:
+                overview = f"Document overview:\n{doc_ctx}\n\n"
+            passages = index.select_passages(user_input, top_k=top_k, token_budget=token_budget - estimate_tokens(overview),
+                                             exclude=sent or ())
+            if passages:
+                excerpts = "\n\n".join(text for _, text in passages)
+                prompt = f"{overview}Relevant excerpts from the uploaded document:\n\n{excerpts}\n\nUser: {user_input}"
+                return prompt, [pid for pid, _ in passages]
+        if doc_ctx and not continuing:
+            # nothing matched lexically: fall back to the start of the summary, still within budget
+            return doc_ctx[:token_budget * 4] + "\n\nUser: " + user_input, []
+        return user_input, []
+
+    def embed_texts(self, texts, batch=EMBED_BATCH, cancel_event=None, on_progress=None):
+        """Embeddings of texts as a float32 matrix, EMBED_BATCH texts per model call"""
+        client = get_ollama_client()
+        vectors = []
+        for i in range(0, len(texts), batch):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessingCancelled()
+            with client.slots:
+                vectors.extend(client.embed(texts[i:i + batch]))
+            if on_progress:
+                on_progress(len(vectors), len(texts))
+        return np.asarray(vectors, dtype=np.float32)
+
+    def add_to_corpus(self, result, cancel_event=None, on_progress=None):
+        """
+        Embed a processed document's chunks into the document library (get_corpus). Returns None
+        when added (or already there), otherwise why not; the document itself stays usable.
+        """
+        corpus = get_corpus()
+        if corpus is None or corpus.has(result["doc_key"]):
+            return None
+        metrics = get_metrics()
+        try:
+            with metrics.stage("embed"):
+                vectors = self.embed_texts(result["chunk_texts"], cancel_event=cancel_event,
+                                           on_progress=on_progress)
+            corpus.add(result["doc_key"], result["filename"], result["chunk_texts"], vectors)
+        except (OllamaError, ValueError, KeyError, OSError, sqlite3.Error) as e:
+            metrics.inc("corpus_errors_total")
+            return str(e)
+        return None
+
+    def process_document(self, uploaded_file, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                         max_workers=SUMMARY_WORKERS, on_progress=None, cancel_event=None):
+        """
+        Document pipeline without any UI:
+        extract (streamed page by page) -> chunk -> chunk store -> send each chunk to Ollama (get summary)
+        -> merge summaries level by level.
+        uploaded_file is a Streamlit UploadedFile or a DocumentFile. on_progress(stage, done, total)
+        is called from the calling thread with stage "summarize" or "level N".
+        Setting cancel_event stops the work and returns {"success": False, "cancelled": True}.
+        Returns {"success", "error"} or, on success, the chunks, per-chunk summaries, summary levels
+        and the merged top-level summary.
+        """
+        metrics = get_metrics()
+        result = self._process_document(uploaded_file, max_tokens, overlap_tokens, max_workers, on_progress,
+                                        cancel_event, metrics)
+        status = "ok" if result["success"] else ("cancelled" if result.get("cancelled") else "failed")
+        metrics.inc("documents_total", status=status)
+        metrics.maybe_export()
+        return result
+
+    def _process_document(self, uploaded_file, max_tokens, overlap_tokens, max_workers, on_progress, cancel_event,
+                          metrics):
+        filename = uploaded_file.name
+        started = time.perf_counter()
+        try:
+            store = get_chunk_store()
+            doc_key = store.doc_key(uploaded_file.getvalue(), max_tokens, overlap_tokens)
+            chunks = []
+            store_seconds = [0.0]
+            blocks = chunker = None
+
+            if store.has(doc_key):
+                # same content chunked before (any session): read the chunks back instead of re-extracting
+                with metrics.stage("chunk_store"):
+                    reader = store.open(doc_key)
+                    try:
+                        chunks = [rec["text"] for rec in reader]
+                    finally:
+                        reader.close()
+                source = chunks
+                writer = None
+            else:
+                # extract page by page -> chunk incrementally -> summarize each chunk as soon as it exists
+                writer = store.writer(doc_key, filename)
+                blocks = TimedIterator(self.iter_text_blocks(uploaded_file))
+                chunker = TimedIterator(self.iter_chunks(blocks, max_tokens=max_tokens, overlap_tokens=overlap_tokens))
+
+                def stream_chunks():
+                    for start, end, ch in chunker:
+                        t = time.perf_counter()
+                        writer.append(start, end, ch)
+                        store_seconds[0] += time.perf_counter() - t
+                        chunks.append(ch)
+                        yield ch
+
+                source = stream_chunks()
+
+            try:
+                with metrics.stage("summarize"):
+                    chunk_summaries = self.summarize_chunks(
+                        source, max_workers=max_workers,
+                        on_progress=(lambda done, total: on_progress("summarize", done, total)) if on_progress else None,
+                        cancel_event=cancel_event, tagger=get_clause_tagger(),
+                    )
+            except Exception as e:
+                if writer:
+                    writer.abort()
+                if isinstance(e, ExtractionError):
+                    return {"success": False, "error": f"Extraction error or empty content: {e}"}
+                raise
+            finally:
+                try:
+                    uploaded_file.seek(0)
+                except Exception:
+                    pass
+
+            if blocks is not None:
+                # extraction runs inside the chunker, which runs inside summarize: report exclusive times
+                metrics.observe("stage_seconds", blocks.seconds, stage="extract")
+                metrics.observe("stage_seconds", chunker.seconds - blocks.seconds, stage="chunk")
+
+            if not chunks:
+                if writer:
+                    writer.abort()
+                return {"success": False, "error": "No chunks created (empty text)."}
+            if writer:
+                t = time.perf_counter()
+                writer.close()
+                metrics.observe("stage_seconds", store_seconds[0] + time.perf_counter() - t, stage="chunk_store")
+
+            failed = [c["index"] for c in chunk_summaries if c["error"]]
+            dedup_hits = sum(1 for c in chunk_summaries if c["deduped"])
+            local = sum(1 for c in chunk_summaries if c["local"])
+            metrics.inc("chunks_total", len(chunks))
+            metrics.inc("summary_dedup_hits_total", dedup_hits)
+            metrics.inc("chunks_summarized_locally_total", local)
+            metrics.inc("chunk_failures_total", len(failed))
+            if len(failed) == len(chunk_summaries):
+                return {"success": False, "error": f"All {len(failed)} chunks failed: {chunk_summaries[0]['error']}"}
+
+            # merge summaries level by level until the document summary fits SUMMARY_TARGET_CHARS
+            with metrics.stage("reduce"):
+                levels = self.reduce_summaries(
+                    chunk_summaries, max_workers=max_workers,
+                    on_progress=(lambda level, done, total: on_progress(f"level {level}", done, total)) if on_progress else None,
+                    cancel_event=cancel_event,
+                )
+            metrics.observe("stage_seconds", time.perf_counter() - started, stage="total")
+
+            return {
+                "success": True,
+                "filename": filename,
+                "doc_key": doc_key,
+                "chunk_texts": chunks,
+                "chunk_summaries": chunk_summaries,
+                "failed_chunks": failed,
+                "cache_hits": sum(1 for c in chunk_summaries if c["cached"]),
+                "dedup_hits": dedup_hits,
+                "local_summaries": local,
+                "clause_index": ClauseTagger.clause_index(chunk_summaries),
+                "levels": levels,
+                "merged": self.format_summary_level(levels[-1]),
+            }
+
+        except ProcessingCancelled:
+            return {"success": False, "cancelled": True, "error": "Cancelled"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
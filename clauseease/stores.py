@@ -0,0 +1,536 @@
+"""On-disk stores: summary cache, near-duplicate index, chunk store and chat history."""
+import glob
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+import streamlit as st
+
+from .config import (
+    CHAT_PAGE_SIZE, CHAT_WRITE_BATCH, CHUNK_PROMPT_TEMPLATE, CHUNK_STORE_MAX_DAYS, CHUNK_STORE_MAX_MB, DATA_DIR,
+    DEDUP_MAX_ENTRIES, DEDUP_THRESHOLD, MODEL_NAME, SUMMARY_CACHE_MAX_MB,
+)
+from .text import tokenize
+
+
+class SummaryCache:
+    """
+    Content-addressed on-disk cache of chunk summaries (SQLite).
+    Keys hash the chunk text together with the model name and prompt template, so the same
+    clause in any upload, session or document reuses its summary. Total stored size is
+    bounded; the least recently used entries are evicted first.
+    """
+
+    def __init__(self, path, max_bytes=int(SUMMARY_CACHE_MAX_MB * 1024 * 1024)):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "key TEXT PRIMARY KEY, summary TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_last_used ON summaries(last_used)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+    @staticmethod
+    def make_key(chunk, model=MODEL_NAME, template=CHUNK_PROMPT_TEMPLATE):
+        h = hashlib.sha256()
+        for part in (model, template, chunk):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: summary} for the keys present, marking them recently used"""
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            unique = list(set(keys))
+            # stay under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, summary FROM summaries WHERE key IN ({marks})", batch).fetchall()
+                found.update(rows)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE summaries SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [time.time()] + [k for k, _ in rows],
+                    )
+            hits = sum(1 for k in keys if k in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def peek(self, key):
+        """Summary for key without counting a hit or miss (used for near-duplicate lookups)"""
+        with self._lock:
+            row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, summary):
+        size = len(summary.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM summaries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, summary, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # drop least recently used entries until we are back under 90% of the budget
+        target = self.max_bytes * 0.9
+        while self._size > target:
+            rows = self._conn.execute("SELECT key, size FROM summaries ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                self._size = 0
+                break
+            dropped = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                dropped.append(key)
+                self._size -= size
+            self._conn.execute(f"DELETE FROM summaries WHERE key IN ({','.join('?' * len(dropped))})", dropped)
+            self.evictions += len(dropped)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_summary_cache():
+    """Summary cache shared by every session in this server process"""
+    return SummaryCache(os.path.join(DATA_DIR, "summary_cache.sqlite3"))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index from chunk text to the summary cache key of a near-identical chunk.
+    Each chunk's word 5-gram set is reduced to num_perm MinHash values; LSH buckets the
+    signature band by band so a lookup only compares against likely matches. A candidate
+    must also have the same numbers and negations ("30 days" vs "60 days", "shall" vs
+    "shall not"), which MinHash alone would happily call similar.
+    """
+
+    _PRIME = (1 << 61) - 1
+    _NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+    _NEGATION = re.compile(r"\b(?:not|no|never|neither|nor|without|except|unless)\b", re.I)
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=64, shingle=5, max_entries=DEDUP_MAX_ENTRIES, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.max_entries = max_entries
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+        self.bands, self.rows = self.lsh_params(threshold, num_perm)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._entries = {}      # key -> (signature, guard); dicts keep insertion order for eviction
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def lsh_params(threshold, num_perm):
+        """(bands, rows) with bands * rows == num_perm whose S-curve midpoint is closest to threshold"""
+        options = [(num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0]
+        return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+    def fingerprint(self, text):
+        """(MinHash signature, guard) for text, or None if it is too short to compare reliably"""
+        words = tokenize(text)
+        if len(words) < self.shingle * 2:
+            return None
+        h = np.array([zlib.crc32(w.encode("utf-8")) for w in words], dtype=np.uint64)
+        # rolling combination of consecutive word hashes -> one 32-bit hash per shingle
+        shingles = np.zeros(len(words) - self.shingle + 1, dtype=np.uint64)
+        for k in range(self.shingle):
+            shingles = (shingles * np.uint64(1000003) + h[k:len(h) - self.shingle + 1 + k]) & np.uint64(0xFFFFFFFF)
+        shingles = np.unique(shingles)
+        sig = ((self._a[:, None] * shingles[None, :] + self._b[:, None]) % np.uint64(self._PRIME)).min(axis=1)
+        guard = (tuple(sorted(self._NUMBER.findall(text))), len(self._NEGATION.findall(text)))
+        return sig, guard
+
+    def _bands(self, sig):
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def query(self, fingerprint):
+        """Key of the most similar indexed chunk at or above the threshold, or None"""
+        sig, guard = fingerprint
+        with self._lock:
+            candidates = set()
+            for bucket, band in zip(self._buckets, self._bands(sig)):
+                candidates.update(bucket.get(band, ()))
+            best, best_sim = None, self.threshold
+            for key in candidates:
+                other, other_guard = self._entries[key]
+                if other_guard != guard:
+                    continue
+                sim = float(np.mean(other == sig))
+                if sim >= best_sim:
+                    best, best_sim = key, sim
+        return best
+
+    def add(self, key, fingerprint):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = fingerprint
+            for bucket, band in zip(self._buckets, self._bands(fingerprint[0])):
+                bucket.setdefault(band, []).append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        sig, _ = self._entries.pop(key)
+        for bucket, band in zip(self._buckets, self._bands(sig)):
+            keys = bucket.get(band)
+            if keys:
+                keys.remove(key)
+                if not keys:
+                    del bucket[band]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+@st.cache_resource(show_spinner=False)
+def get_dedup_index():
+    """Near-duplicate index shared by every session in this server process (None if disabled)"""
+    if DEDUP_THRESHOLD <= 0:
+        return None
+    return NearDuplicateIndex()
+
+
+class ChunkWriter:
+    """Appends chunk records for one document; nothing is visible to readers until close()"""
+
+    def __init__(self, store, key, filename):
+        self.store = store
+        self.key = key
+        self.filename = filename
+        self.count = 0
+        self._suffix = f".tmp{os.getpid()}-{threading.get_ident()}"
+        self._records = open(store.path(key, ".jsonl") + self._suffix, "wb")
+        self._offsets = [0]
+
+    def append(self, start, end, text):
+        line = json.dumps({"start": start, "end": end, "text": text}, ensure_ascii=False, separators=(",", ":"))
+        data = line.encode("utf-8") + b"\n"
+        self._records.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self.count += 1
+
+    def close(self):
+        """Publish the document: records, then offset index, then metadata (which marks it complete)"""
+        self._records.close()
+        records = self.store.path(self.key, ".jsonl")
+        index = self.store.path(self.key, ".idx")
+        meta = self.store.path(self.key, ".meta.json")
+        np.asarray(self._offsets, dtype="<u8").tofile(index + self._suffix)
+        with open(meta + self._suffix, "w", encoding="utf-8") as f:
+            json.dump({"filename": self.filename, "created_at": datetime.now().isoformat(), "chunks_count": self.count},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(records + self._suffix, records)
+        os.replace(index + self._suffix, index)
+        os.replace(meta + self._suffix, meta)
+        self.store.maybe_cleanup()
+
+    def abort(self):
+        self._records.close()
+        try:
+            os.remove(self.store.path(self.key, ".jsonl") + self._suffix)
+        except OSError:
+            pass
+
+
+class ChunkReader:
+    """Memory-mapped random access to one stored document's chunks"""
+
+    def __init__(self, store, key):
+        with open(store.path(key, ".meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self._offsets = np.fromfile(store.path(key, ".idx"), dtype="<u8")
+        self._file = open(store.path(key, ".jsonl"), "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if len(self._offsets) > 1 else b""
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._mm[int(self._offsets[i]):int(self._offsets[i + 1])])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._file.close()
+
+
+class ChunkStore:
+    """
+    Append-only on-disk chunk store, one document per content hash.
+    Each document is a compact JSONL record file, a uint64 offset index for memory-mapped
+    random access, and a small metadata file. Documents are keyed by a hash of the file
+    content and chunking settings, so an identical upload in any later session skips
+    extraction and chunking. Old or excess documents are removed by cleanup().
+    """
+
+    def __init__(self, root, max_age_days=CHUNK_STORE_MAX_DAYS, max_bytes=int(CHUNK_STORE_MAX_MB * 1024 * 1024)):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def doc_key(raw, *params):
+        h = hashlib.sha256(raw)
+        for p in params:
+            h.update(f"\0{p}".encode("utf-8"))
+        return h.hexdigest()
+
+    def path(self, key, ext):
+        return os.path.join(self.root, key + ext)
+
+    def has(self, key):
+        return os.path.exists(self.path(key, ".meta.json"))
+
+    def writer(self, key, filename):
+        return ChunkWriter(self, key, filename)
+
+    def open(self, key):
+        # touch the metadata so cleanup treats the document as recently used
+        os.utime(self.path(key, ".meta.json"))
+        return ChunkReader(self, key)
+
+    def maybe_cleanup(self, interval=3600):
+        if time.time() - self._last_cleanup >= interval:
+            self.cleanup()
+
+    def cleanup(self):
+        """Delete documents past max age, then least recently used ones until under max size"""
+        with self._lock:
+            self._last_cleanup = time.time()
+            docs = []
+            for meta in glob.glob(os.path.join(self.root, "*.meta.json")):
+                key = os.path.basename(meta)[:-len(".meta.json")]
+                files = [self.path(key, ext) for ext in (".jsonl", ".idx", ".meta.json")]
+                size = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+                docs.append((os.path.getmtime(meta), size, files))
+            docs.sort()
+
+            total = sum(size for _, size, _ in docs)
+            removed = 0
+            for used, size, files in docs:
+                if self._last_cleanup - used <= self.max_age and total <= self.max_bytes:
+                    break
+                for f in reversed(files):  # metadata first, so a half-deleted document is never "complete"
+                    try:
+                        os.remove(f)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+
+            # leftovers: unpublished temp files and the old per-upload /tmp/clauseease_*.json dumps
+            import tempfile
+            leftovers = glob.glob(os.path.join(self.root, "*.tmp*")) + glob.glob(os.path.join(tempfile.gettempdir(), "clauseease_*.json"))
+            for f in leftovers:
+                try:
+                    if self._last_cleanup - os.path.getmtime(f) > 86400:
+                        os.remove(f)
+                except OSError:
+                    pass
+            return removed
+
+
+@st.cache_resource(show_spinner=False)
+def get_chunk_store():
+    """Chunk store shared by every session in this server process"""
+    store = ChunkStore(os.path.join(DATA_DIR, "chunks"))
+    store.maybe_cleanup()
+    return store
+
+
+class ChatStore:
+    """
+    Persistent chat history (SQLite, WAL).
+    Sessions belong to an owner id (one per browser, kept in the page URL) and remember the
+    document loaded in them and the model conversation context. Messages are numbered per session and read a page at a time;
+    new ones are numbered here, so several tabs on one chat never reuse a number, and written in batches by flush().
+    """
+
+    def __init__(self, path, batch_size=CHAT_WRITE_BATCH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = []
+        self._next_seq = {}         # session id -> seq of its next message
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, owner TEXT NOT NULL, name TEXT NOT NULL, created REAL NOT NULL, "
+            "updated REAL NOT NULL, messages INTEGER NOT NULL DEFAULT 0, doc TEXT, context TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "context" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN context TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_owner ON sessions(owner, updated)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "created REAL NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+
+    def create_session(self, owner, name):
+        now = time.time()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO sessions (id, owner, name, created, updated) VALUES (?, ?, ?, ?, ?)",
+                               (session_id, owner, name, now, now))
+        return {"id": session_id, "name": name, "updated": now, "messages": 0, "doc": None, "context": None}
+
+    def list_sessions(self, owner, limit=6):
+        """Most recently used sessions' metadata (no messages)"""
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT id, name, updated, messages FROM sessions WHERE owner = ? ORDER BY updated DESC LIMIT ?",
+                (owner, limit),
+            ).fetchall()
+        return [{"id": r[0], "name": r[1], "updated": r[2], "messages": r[3]} for r in rows]
+
+    def count_sessions(self, owner):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions WHERE owner = ?", (owner,)).fetchone()[0]
+
+    def get_session(self, owner, session_id=None):
+        """One session with its document, or the owner's most recent one if session_id is None"""
+        with self._lock:
+            self._flush()
+            if session_id is None:
+                row = self._conn.execute(
+                    "SELECT id, name, updated, messages, doc, context FROM sessions WHERE owner = ? "
+                    "ORDER BY updated DESC LIMIT 1",
+                    (owner,),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT id, name, updated, messages, doc, context FROM sessions WHERE owner = ? AND id = ?",
+                    (owner, session_id),
+                ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "name": row[1], "updated": row[2], "messages": row[3],
+                "doc": json.loads(row[4]) if row[4] else None, "context": json.loads(row[5]) if row[5] else None}
+
+    def messages(self, session_id, before=None, limit=CHAT_PAGE_SIZE):
+        """Up to limit messages preceding seq `before` (default: the latest ones), oldest first"""
+        with self._lock:
+            self._flush()
+            rows = self._conn.execute(
+                "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (session_id, before if before is not None else 2 ** 62, limit),
+            ).fetchall()
+        return [{"seq": seq, "role": role, "content": content} for seq, role, content in reversed(rows)]
+
+    def add_message(self, session_id, role, content):
+        """Buffer a message for the session; returns its seq"""
+        with self._lock:
+            seq = self._next_seq.get(session_id)
+            if seq is None:
+                seq = self._conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE session_id = ?",
+                                         (session_id,)).fetchone()[0]
+            self._next_seq[session_id] = seq + 1
+            self._pending.append((session_id, seq, role, content, time.time()))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+        return seq
+
+    def set_doc(self, session_id, doc):
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET doc = ?, updated = ? WHERE id = ?",
+                               (json.dumps(doc, ensure_ascii=False), time.time(), session_id))
+
+    def set_context(self, session_id, context):
+        """Store (or with None, drop) the session's model conversation state"""
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET context = ? WHERE id = ?",
+                               (json.dumps(context, separators=(",", ":")) if context else None, session_id))
+
+    def clear(self, session_id):
+        """Delete a session's messages (the session and its document stay)"""
+        with self._lock:
+            self._flush()
+            self._next_seq.pop(session_id, None)
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("UPDATE sessions SET messages = 0, updated = ? WHERE id = ?", (time.time(), session_id))
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        last = {}
+        for session_id, seq, _, _, created in pending:
+            last[session_id] = (max(seq + 1, last.get(session_id, (0, 0))[0]), created)
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, created) VALUES (?, ?, ?, ?, ?)",
+                pending,
+            )
+            self._conn.executemany(
+                "UPDATE sessions SET messages = MAX(messages, ?), updated = ? WHERE id = ?",
+                [(count, created, session_id) for session_id, (count, created) in last.items()],
+            )
+
+
+@st.cache_resource(show_spinner=False)
+def get_chat_store():
+    """Chat history shared by every session in this server process"""
+    return ChatStore(os.path.join(DATA_DIR, "chats.sqlite3"))
@@ -0,0 +1,346 @@
+"""Text helpers without I/O: token estimates, the glossary matcher, clause tagging and the chat search index."""
+import json
+import math
+import re
+
+import numpy as np
+import streamlit as st
+
+from .config import (
+    CHUNK_PROMPT_TEMPLATE, CONTEXT_TOKEN_BUDGET, CONTEXT_TOP_K, FOCUSED_PROMPT_TEMPLATE, GLOSSARY_PATH,
+    PRETAG_CHUNKS,
+)
+
+
+DEFAULT_GLOSSARY = {
+    "hereinafter": "from now on",
+    "notwithstanding": "despite",
+    "forthwith": "immediately",
+    "pursuant to": "according to",
+    "in lieu of": "instead of",
+    "termination": "ending",
+    "obligation": "duty",
+    "indemnify": "protect from loss",
+    "warranty": "guarantee",
+    "liability": "legal responsibility",
+    "party of the first part": "first party",
+    "party of the second part": "second party",
+    "thirty (30) days": "30 days",
+    "written notice": "written notification",
+    "either party": "any party",
+    "this agreement": "this contract"
+}
+
+
+class GlossaryMatcher:
+    """
+    Single-pass term replacement for simplify_text.
+    All glossary terms are compiled into one trie-shaped regex, so matching is one scan
+    over the text whose cost per position depends on term length, not glossary size.
+    Matches are case-insensitive, whole-word and leftmost-longest ("party of the first
+    part" wins over "party"); replacements are never re-scanned.
+    """
+
+    def __init__(self, glossary):
+        self.glossary = {}
+        for term, replacement in glossary.items():
+            key = self._normalize(term)
+            if key:
+                self.glossary[key] = replacement
+
+        trie = {}
+        for term in self.glossary:
+            node = trie
+            for ch in term:
+                node = node.setdefault(ch, {})
+            node[""] = True  # end of term
+
+        body = self._trie_regex(trie) if self.glossary else "(?!)"
+        self._pattern = re.compile(r"(?<!\w)" + body + r"(?!\w)", re.IGNORECASE)
+
+    @staticmethod
+    def _normalize(term):
+        return " ".join(term.lower().split())
+
+    @classmethod
+    def _trie_regex(cls, node):
+        ends_here = "" in node
+        branches = []
+        for ch in sorted(k for k in node if k):
+            # a space in a term matches any run of whitespace (terms wrap across lines in documents)
+            head = r"\s+" if ch == " " else re.escape(ch)
+            branches.append(head + cls._trie_regex(node[ch]))
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            # greedy: try the longer term first, fall back to the term ending here
+            body = "(?:" + body + ")?" if len(branches) == 1 else body + "?"
+        return body
+
+    @classmethod
+    def from_file(cls, path, base=None):
+        """Load a glossary file (JSON object, or CSV/TSV with term,replacement rows) over base"""
+        glossary = dict(base or {})
+        with open(path, encoding="utf-8") as f:
+            if path.lower().endswith(".json"):
+                glossary.update(json.load(f))
+            else:
+                import csv
+                delimiter = "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+                for row in csv.reader(f, delimiter=delimiter):
+                    if len(row) >= 2 and row[0].strip() and not row[0].startswith("#"):
+                        glossary[row[0].strip()] = row[1].strip()
+        return cls(glossary)
+
+    def __len__(self):
+        return len(self.glossary)
+
+    def replace(self, text, template="**{}**"):
+        """Replace every glossary term in text with its simple form, in a single pass"""
+        def substitute(match):
+            found = match.group(0)
+            simple = self.glossary[self._normalize(found)]
+            if found[:1].isupper() and simple:
+                simple = simple[0].upper() + simple[1:]
+            return template.format(simple)
+
+        return self._pattern.sub(substitute, text)
+
+
+@st.cache_resource(show_spinner=False)
+def get_glossary_matcher(path=GLOSSARY_PATH):
+    """Compiled glossary shared by every session (compiling thousands of terms is not free)"""
+    if path:
+        return GlossaryMatcher.from_file(path, base=DEFAULT_GLOSSARY)
+    return GlossaryMatcher(DEFAULT_GLOSSARY)
+
+
+# Chunk boundaries: sentence/clause ends, paragraph breaks, and line breaks before a section heading
+_HEADING = (
+    r"[ \t]*(?:(?:ARTICLE|Article|SECTION|Section|CLAUSE|Clause|SCHEDULE|Schedule|EXHIBIT|Exhibit|ANNEX|Annex)\b"
+    r"|§|\d+(?:\.\d+)*[.)]?[ \t]+[A-Z]|\([a-z0-9]{1,4}\)[ \t]|[A-Z][A-Z0-9 ,&/\-]{3,}[ \t]*\n)"
+)
+_UNIT_END_RE = re.compile(r"[.!?;:][\"')\]]*\s+|\n[ \t]*\n\s*|\n(?=" + _HEADING + ")")
+_HEADING_RE = re.compile(_HEADING)
+_ABBREVIATIONS = frozenset(
+    "inc ltd co corp llc no nos sec secs art arts cl para e.g i.e etc vs mr mrs ms dr st viz approx".split()
+)
+
+
+_MONTH = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?"
+
+
+class ClauseTagger:
+    """
+    Fast local pre-pass over chunks: tags each one with the clause types its wording suggests
+    (compiled patterns, no model calls) and decides how it should be summarized.
+    """
+
+    PATTERNS = {
+        "date": (
+            r"\b" + _MONTH + r"\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b"
+            r"|\b\d{1,2}(?:st|nd|rd|th)?\s+(?:day\s+of\s+)?" + _MONTH + r",?\s+\d{4}\b"
+            r"|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b|\b\d{4}-\d{2}-\d{2}\b"
+            r"|\b\d+\)?\s+(?:business\s+|calendar\s+|working\s+)?(?:days?|weeks?|months?|years?)\b"
+        ),
+        "money": (
+            r"[$€£¥₹]\s?\d[\d,]*(?:\.\d+)?|\b(?:USD|EUR|GBP|INR|Rs\.?)\s?\d[\d,]*"
+            r"|\b\d[\d,]*(?:\.\d+)?\s?(?:USD|EUR|GBP|INR|dollars|euros|pounds|rupees)\b"
+        ),
+        "obligation": (
+            r"\b(?:shall|must|agrees?\s+to|undertakes?\s+to|(?:is|are)\s+(?:required|obligated)\s+to"
+            r"|may\s+not|will\s+not)\b(?!\s+(?:mean|have\s+the\s+meaning|include|be\s+construed|be\s+deemed\s+to\s+mean)\b)"
+        ),
+        "termination": r"\b(?:terminat\w*|expir\w*|non-renewal|rescind\w*|rescission)\b",
+        "indemnity": r"\b(?:indemnif\w*|indemnit\w*|hold\s+harmless)\b",
+        "liability": r"\b(?:liabilit\w*|liable|consequential\s+damages)\b",
+        "payment": r"\b(?:payable|payments?|paid|pays?|invoic\w*|fees?|compensation|remuneration|late\s+charges?)\b",
+        "confidentiality": r"\b(?:confidential\w*|non-disclosure|trade\s+secrets?)\b",
+        "governing_law": r"\b(?:governing\s+law|governed\s+by|jurisdiction|arbitrat\w*)\b",
+        "definitions": (
+            r"[\"“][A-Z][^\"”\n]{0,60}[\"”]\s+(?:shall\s+)?(?:means?|refers?\s+to|(?:shall\s+)?ha(?:s|ve)\s+the\s+meaning)\b"
+            r"|^[ \t]*(?:\d+(?:\.\d+)*[.)]?[ \t]+)?(?:DEFINITIONS|Definitions)\b"
+        ),
+        "signature": (
+            r"\bIN\s+WITNESS\s+WHEREOF\b|\bAuthori[sz]ed\s+Signator\w*|\bSignature\s*:|\bBy\s*:\s*_{2,}|_{8,}"
+        ),
+    }
+    # Focus line of the prompt for each clause type that warrants one, in prompt order
+    FOCUS = {
+        "termination": "termination rights, triggers and notice periods",
+        "indemnity": "who indemnifies whom, and for what",
+        "liability": "limits and exclusions of liability",
+        "payment": "payments, fees and when they are due",
+        "money": "the amounts involved",
+        "confidentiality": "what must be kept confidential and for how long",
+        "governing_law": "governing law and dispute resolution",
+    }
+    SUBSTANTIVE = frozenset(("date", "money", "obligation", "termination", "indemnity", "liability", "payment",
+                             "confidentiality", "governing_law"))
+    _QUOTED_RE = re.compile(r"[\"“][^\"”\n]{0,60}[\"”]")
+    _TERM_RE = re.compile(r"[\"“]([A-Z][^\"”\n]{0,60})[\"”]\s+(?:shall\s+)?(?:means?|refers?\s+to|(?:shall\s+)?ha(?:s|ve)\s+the\s+meaning)\b")
+
+    def __init__(self, min_words=40, max_terms=12):
+        self.min_words = min_words
+        self.max_terms = max_terms
+        # defined terms and signature lines are recognised by their capitalisation
+        self._patterns = [(name, re.compile(p, re.MULTILINE if name in ("definitions", "signature") else re.IGNORECASE))
+                          for name, p in self.PATTERNS.items()]
+
+    def tag(self, text):
+        """Clause types found in text, in PATTERNS order"""
+        # a quoted defined term ("Confidential Information" means ...) is not a clause of that type
+        plain = self._QUOTED_RE.sub(" ", text)
+        return [name for name, pattern in self._patterns
+                if pattern.search(text if name in ("definitions", "signature") else plain)]
+
+    def local_summary(self, text, tags):
+        """
+        Summary for a chunk not worth a model call, or None. Signature blocks (a date next to the
+        signatures doesn't count), definitions with no obligations in them, and short untagged
+        text such as a cover page or heading qualify.
+        """
+        substantive = self.SUBSTANTIVE.intersection(tags)
+        if "signature" in tags and substantive <= {"date"}:
+            return "Signature block."
+        if substantive:
+            return None
+        if "definitions" in tags:
+            terms = list(dict.fromkeys(m.group(1).strip() for m in self._TERM_RE.finditer(text)))
+            if not terms:
+                return "Definitions."
+            more = len(terms) - self.max_terms
+            return ("Defines " + ", ".join(f"“{t}”" for t in terms[:self.max_terms])
+                    + (f" and {more} more terms." if more > 0 else "."))
+        if len(text.split()) < self.min_words:
+            line = " ".join(text.split())
+            return "Heading or cover text: " + (line[:120] + "…" if len(line) > 120 else line)
+        return None
+
+    def prompt_template(self, tags, default=CHUNK_PROMPT_TEMPLATE):
+        """A prompt focused on the chunk's clause types; default when none of them needs a focus"""
+        focus = [self.FOCUS[t] for t in self.FOCUS if t in tags]
+        if not focus:
+            return default
+        return FOCUSED_PROMPT_TEMPLATE.format(focus="; ".join(focus) + "; and any key obligations or deadlines")
+
+    @staticmethod
+    def clause_index(chunk_summaries):
+        """{clause type: [chunk index, ...]} from summarize_chunks results"""
+        index = {}
+        for c in chunk_summaries:
+            for t in c.get("tags", ()):
+                index.setdefault(t, []).append(c["index"])
+        return index
+
+
+@st.cache_resource(show_spinner=False)
+def get_clause_tagger():
+    """Compiled clause patterns shared by every session; None when CLAUSEEASE_PRETAG=0"""
+    return ClauseTagger() if PRETAG_CHUNKS else None
+
+
+def estimate_tokens(text):
+    """Rough model-token estimate (~4 characters per token for English prose)"""
+    return (len(text) + 3) // 4
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "what which who how does do i me my we our you your".split()
+)
+
+
+def tokenize(text):
+    """Lower-cased word tokens without stopwords (shared by indexing and querying)"""
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 index over document passages.
+    Each term keeps NumPy arrays of (passage id, term frequency), so a query costs one
+    vectorized update per query term instead of a scan over every passage.
+    """
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        # passages: list of {"text": str sent to the model, "search_text": str that is scored,
+        #                    "fallback": optional shorter text sent when "text" doesn't fit the budget}
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        postings = {}
+        lengths = np.zeros(len(passages), dtype=np.float32)
+        for pid, passage in enumerate(passages):
+            terms = tokenize(passage.get("search_text") or passage["text"])
+            lengths[pid] = len(terms)
+            counts = {}
+            for t in terms:
+                counts[t] = counts.get(t, 0) + 1
+            for t, c in counts.items():
+                postings.setdefault(t, ([], []))
+                postings[t][0].append(pid)
+                postings[t][1].append(c)
+
+        n = max(len(passages), 1)
+        avgdl = float(lengths.mean()) if len(passages) else 1.0
+        # per-passage length normalisation, precomputed once
+        self._norm = k1 * (1 - b + b * lengths / max(avgdl, 1.0))
+        self._postings = {}
+        for t, (ids, tfs) in postings.items():
+            df = len(ids)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            self._postings[t] = (np.asarray(ids, dtype=np.int32), np.asarray(tfs, dtype=np.float32), idf)
+
+    def __len__(self):
+        return len(self.passages)
+
+    def nbytes(self):
+        """Estimated memory held by the index: passage texts plus postings arrays"""
+        texts = sum(len(v) for p in self.passages for v in p.values() if isinstance(v, str))
+        postings = sum(ids.nbytes + tfs.nbytes + 100 for ids, tfs, _ in self._postings.values())
+        return texts + postings + self._norm.nbytes
+
+    def search(self, query, top_k=CONTEXT_TOP_K):
+        """Return [(passage_id, score)] for the best matching passages, best first"""
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        for t in set(tokenize(query)):
+            posting = self._postings.get(t)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[ids])
+
+        hits = np.flatnonzero(scores > 0)
+        if not len(hits):
+            return []
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    def select_context(self, query, top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET):
+        """Texts of the best passages for query, in document order, whose combined size fits token_budget"""
+        return [text for _, text in self.select_passages(query, top_k, token_budget)]
+
+    def select_passages(self, query, top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET, exclude=()):
+        """select_context as [(passage_id, text)], skipping passages in exclude (e.g. already sent)"""
+        chosen = []
+        used = 0
+        for pid, _ in self.search(query, top_k):
+            if pid in exclude:
+                continue
+            passage = self.passages[pid]
+            # prefer the full passage; fall back to its shorter form (e.g. the summary) if that doesn't fit
+            for text in (passage["text"], passage.get("fallback")):
+                if not text:
+                    continue
+                cost = estimate_tokens(text)
+                if used + cost <= token_budget:
+                    chosen.append((pid, text))
+                    used += cost
+                    break
+        return sorted(chosen)
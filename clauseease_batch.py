@@ -0,0 +1,172 @@
+"""
+Headless batch processing for ClauseEase.
+
+Runs the same extract -> chunk -> summarize pipeline as the Streamlit app over a
+directory (or list) of contracts and writes one JSON line per document.
+
+    python clauseease_batch.py contracts/ --out results.jsonl --workers 4
+    python clauseease_batch.py a.pdf b.docx --out results.jsonl --resume
+    python clauseease_batch.py contracts/ --library      # make them searchable from the chat
+
+Model concurrency is still capped process-wide by CLAUSEEASE_MAX_INFLIGHT, so
+--workers mostly overlaps extraction of one document with summarization of another.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from clauseease.config import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, SUMMARY_WORKERS
+from clauseease.extract import DocumentFile
+from clauseease.pipeline import ClauseEasePipeline
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc", ".txt")
+
+
+def find_documents(paths, recursive=True):
+    """Expand files and directories into a sorted list of supported document paths"""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        found.append(os.path.join(root, name))
+                if not recursive:
+                    break
+        elif os.path.isfile(path):
+            found.append(path)
+        else:
+            print(f"warning: {path} not found, skipping", file=sys.stderr)
+    return found
+
+
+def already_done(out_path):
+    """Paths that already have a successful result in an existing output file"""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("success"):
+                done.add(record.get("path"))
+    return done
+
+
+def process_path(pipeline, path, args):
+    start = time.perf_counter()
+    try:
+        doc = DocumentFile.from_path(path)
+    except OSError as e:
+        return {"path": path, "success": False, "error": str(e), "seconds": 0.0}
+
+    result = pipeline.process_document(doc, max_tokens=args.max_tokens, overlap_tokens=args.overlap,
+                                       max_workers=args.chunk_workers)
+    record = {"path": path, "filename": doc.name, "success": result["success"],
+              "seconds": round(time.perf_counter() - start, 3)}
+    if not result["success"]:
+        record["error"] = result.get("error")
+        return record
+
+    if args.library:
+        error = pipeline.add_to_corpus(result)
+        if error:
+            record["library_error"] = error
+    record.update({
+        "doc_key": result["doc_key"],
+        "chunks": len(result["chunk_texts"]),
+        "failed_chunks": result["failed_chunks"],
+        "cache_hits": result["cache_hits"],
+        "dedup_hits": result["dedup_hits"],
+        "local_summaries": result["local_summaries"],
+        "clause_index": result["clause_index"],
+        "summary": result["merged"],
+        "chunk_summaries": [c["summary"] for c in result["chunk_summaries"]],
+        # per-chunk model latency; cached, deduplicated and locally summarized chunks didn't call the model
+        "chunk_seconds": [c["seconds"] for c in result["chunk_summaries"]
+                          if not (c["cached"] or c["deduped"] or c["local"]) and c["seconds"] is not None],
+    })
+    return record
+
+
+def report(records, elapsed):
+    """Throughput summary: documents/min, chunks/s and per-chunk latency percentiles"""
+    ok = [r for r in records if r["success"]]
+    chunks = sum(r["chunks"] for r in ok)
+    latencies = np.array([s for r in ok for s in r["chunk_seconds"]], dtype=float)
+    stats = {
+        "documents": len(records),
+        "succeeded": len(ok),
+        "failed": len(records) - len(ok),
+        "chunks": chunks,
+        "cache_hits": sum(r["cache_hits"] for r in ok),
+        "model_calls_avoided_by_dedup": sum(r.get("dedup_hits", 0) for r in ok),
+        "model_calls_avoided_by_pretag": sum(r.get("local_summaries", 0) for r in ok),
+        "elapsed_s": round(elapsed, 3),
+        "documents_per_min": round(len(records) / elapsed * 60, 2) if elapsed else 0.0,
+        "chunks_per_s": round(chunks / elapsed, 2) if elapsed else 0.0,
+        "chunk_latency_p50_s": round(float(np.percentile(latencies, 50)), 3) if latencies.size else None,
+        "chunk_latency_p95_s": round(float(np.percentile(latencies, 95)), 3) if latencies.size else None,
+    }
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a directory or list of contracts without the web UI.")
+    parser.add_argument("paths", nargs="+", help="contract files and/or directories")
+    parser.add_argument("--out", default="clauseease_results.jsonl", help="JSONL output file (appended to)")
+    parser.add_argument("--workers", type=int, default=2, help="documents processed in parallel")
+    parser.add_argument("--chunk-workers", type=int, default=SUMMARY_WORKERS, help="summary workers per document")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_TOKENS, help="chunk size in estimated tokens")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS, help="chunk overlap in estimated tokens")
+    parser.add_argument("--no-recursive", action="store_true", help="don't descend into subdirectories")
+    parser.add_argument("--resume", action="store_true", help="skip documents already summarized in --out")
+    parser.add_argument("--stats", help="also write the throughput summary to this JSON file")
+    parser.add_argument("--library", action="store_true",
+                        help="also add each document to the app's document library (chunk embeddings)")
+    args = parser.parse_args(argv)
+
+    paths = find_documents(args.paths, recursive=not args.no_recursive)
+    if args.resume:
+        done = already_done(args.out)
+        paths = [p for p in paths if p not in done]
+    if not paths:
+        print("nothing to do", file=sys.stderr)
+        return 0
+
+    pipeline = ClauseEasePipeline()
+    records = []
+    start = time.perf_counter()
+    with open(args.out, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="clauseease-doc") as pool:
+        futures = {pool.submit(process_path, pipeline, path, args): path for path in paths}
+        for fut in as_completed(futures):
+            try:
+                record = fut.result()
+            except Exception as e:
+                record = {"path": futures[fut], "success": False, "error": str(e), "seconds": 0.0}
+            records.append(record)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            status = f"{record.get('chunks', 0)} chunks" if record["success"] else f"FAILED: {record.get('error')}"
+            print(f"[{len(records)}/{len(paths)}] {record['path']} ({record['seconds']}s) {status}", file=sys.stderr)
+
+    stats = report(records, time.perf_counter() - start)
+    print(json.dumps(stats, indent=2))
+    if args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
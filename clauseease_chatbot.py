@@ -1,39 +1,36 @@
-import streamlit as st
-from datetime import datetime
-import requests
-import tempfile
+import hashlib
 import json
-import io
-import os
+import random
+import re
+import time
+import uuid
+from datetime import datetime
 
-# PDF/DOCX extraction libraries 
-try:
-    from PyPDF2 import PdfReader
-except Exception:
-    PdfReader = None
+import streamlit as st
 
-try:
-    from docx import Document
-except Exception:
-    Document = None
+from clauseease.answers import get_canned_responses, get_prepared_answers
+from clauseease.config import (
+    CHAT_PAGE_SIZE, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, CONTEXT_TOKEN_BUDGET, CONTEXT_TOP_K, CORPUS_TOP_K,
+    DOC_INDEX_CACHE_MB, EXAMPLE_PROMPT, HELP_PROMPT, LONG_MESSAGE_CHARS, MODEL_CONTEXT_TOKENS, MORE_EXAMPLE_PROMPTS,
+    RERUN_BUDGET_MS, SESSION_MEMORY_MB, SESSION_STORE_MB, STANDARD_QUESTIONS, SUMMARY_TARGET_CHARS, SUMMARY_WORKERS,
+)
+from clauseease.corpus import get_corpus
+from clauseease.jobs import get_job_queue
+from clauseease.memory import estimate_size, get_doc_index_cache, get_session_blobs
+from clauseease.metrics import get_metrics
+from clauseease.ollama import OllamaError, get_ollama_client
+from clauseease.pipeline import ClauseEasePipeline
+from clauseease.stores import get_chat_store, get_chunk_store
+from clauseease.text import estimate_tokens
 
+# Streamlit executes this whole file on every rerun; run() reports the time from here
+_SCRIPT_STARTED = time.perf_counter()
 
-class UniqueClauseEase:
-    def __init__(self):
-        self.setup_page()
-        self.initialize_session_state()
 
-    def setup_page(self):
-        st.set_page_config(
-            page_title="ClauseEase",
-            page_icon="⚖️",
-            layout="wide",
-            initial_sidebar_state="expanded"
-        )
-
-        # Unique modern CSS 
-        st.markdown("""
-        <style>
+@st.cache_resource(show_spinner=False)
+def get_page_css():
+    """The app's <style> block with comments and indentation stripped"""
+    css = """
         /* Main theme colors */
         :root {
             --primary: #7B1FA2;
@@ -253,27 +250,59 @@ class UniqueClauseEase:
             margin: 8px 0;
             border-left: 4px solid var(--secondary);
         }
-        </style>
-        """, unsafe_allow_html=True)
+"""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return f"<style>{css.strip()}</style>"
+
+
+class UniqueClauseEase(ClauseEasePipeline):
+    def __init__(self):
+        self.waited_on_model = False
+        # first run in this server process: load the model and precompute the quick actions
+        get_canned_responses()
+        self.setup_page()
+        self.initialize_session_state()
+
+    def setup_page(self):
+        st.set_page_config(
+            page_title="ClauseEase",
+            page_icon="⚖️",
+            layout="wide",
+            initial_sidebar_state="expanded"
+        )
+
+        # Unique modern CSS (minified once per process; it is still sent on every rerun)
+        st.markdown(get_page_css(), unsafe_allow_html=True)
 
     def initialize_session_state(self):
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
         if "uploaded_files" not in st.session_state:
             st.session_state.uploaded_files = []
-        if "current_chat" not in st.session_state:
-            st.session_state.current_chat = "chat_1"
-        if "chat_sessions" not in st.session_state:
-            st.session_state.chat_sessions = {
-                "chat_1": {"name": "Contract Discussion", "messages": [], "timestamp": datetime.now()}
-            }
+        if "chat_owner" not in st.session_state:
+            # one history per browser: the owner id lives in the URL so a refresh finds it again
+            # (it is a bearer token for these chats, see CHAT_PAGE_SIZE)
+            owner = st.query_params.get("user") or uuid.uuid4().hex
+            st.query_params["user"] = owner
+            st.session_state.chat_owner = owner
+        if "memory_owner" not in st.session_state:
+            st.session_state.memory_owner = uuid.uuid4().hex   # this session's share of get_session_blobs()
         # New session state keys for doc pipeline
-        if "doc_memory" not in st.session_state:
-            st.session_state.doc_memory = ""            # merged summaries from chunks
-        if "processed_files" not in st.session_state:
-            st.session_state.processed_files = set()    # filenames processed this session
-        if "processing_doc" not in st.session_state:
-            st.session_state.processing_doc = False    # flag while processing
+        if "doc" not in st.session_state:
+            # current document {"filename", "doc_key", "chat", "blob"}: its summaries (merged and
+            # reduce levels) are in the blob store, its LexicalIndex in get_doc_index_cache()
+            st.session_state.doc = None
+        if "handled_uploads" not in st.session_state:
+            # (chat id, upload key) of uploads already queued for a chat, however their job ended;
+            # uploading the file again (e.g. an amended contract) gives it a new key
+            st.session_state.handled_uploads = set()
+        if "doc_jobs" not in st.session_state:
+            st.session_state.doc_jobs = {}             # id of a background job -> its filename
+        if "current_chat" not in st.session_state:
+            store = get_chat_store()
+            chat = store.get_session(st.session_state.chat_owner) or store.create_session(
+                st.session_state.chat_owner, "Contract Discussion")
+            self.open_chat(chat)
 
     def process_file(self, uploaded_file):
         """Process uploaded file with proper error handling (keeps original behaviour)"""
@@ -308,203 +337,231 @@ class UniqueClauseEase:
                 "size": "Unknown"
             }
 
-    def simplify_text(self, text):
-        """Simplify contract text with enhanced processing"""
-        simplifications = {
-            "hereinafter": "from now on",
-            "notwithstanding": "despite",
-            "forthwith": "immediately",
-            "pursuant to": "according to",
-            "in lieu of": "instead of",
-            "termination": "ending",
-            "obligation": "duty",
-            "indemnify": "protect from loss",
-            "warranty": "guarantee",
-            "liability": "legal responsibility",
-            "party of the first part": "first party",
-            "party of the second part": "second party",
-            "thirty (30) days": "30 days",
-            "written notice": "written notification",
-            "either party": "any party",
-            "this agreement": "this contract"
-        }
+    def build_chat_prompt(self, user_input, top_k=CONTEXT_TOP_K, token_budget=CONTEXT_TOKEN_BUDGET, sent=None):
+        """
+        Prompt for a chat question: about the current document (see document_prompt), or, for
+        questions scoped to the document library (see chat_scope), with library passages instead.
+        Returns (prompt, ids of the passages attached).
+        """
+        scope = self.chat_scope()
+        if scope is None or scope:
+            prompt = self.build_library_prompt(user_input, scope, token_budget=token_budget)
+            if prompt is not None:
+                return prompt, []
+        summaries = self.doc_summaries()
+        return self.document_prompt(user_input, self.doc_index(), summaries["merged"] if summaries else "",
+                                    top_k=top_k, token_budget=token_budget, sent=sent)
 
-        simplified = text
-        for complex_word, simple_word in simplifications.items():
-            simplified = simplified.replace(complex_word, f"**{simple_word}**")
+    def chat_scope(self):
+        """doc_keys of the library documents questions are about: None for all, [] for just the current document"""
+        if get_corpus() is None:
+            return []
+        if st.session_state.get("scope_all"):
+            return None
+        return st.session_state.get("scope_docs") or []
 
-        return simplified
+    def build_library_prompt(self, user_input, doc_keys, token_budget=CONTEXT_TOKEN_BUDGET, top_k=CORPUS_TOP_K):
+        """Prompt with the library passages closest to the question in meaning (None if it can't be searched)"""
+        try:
+            query = get_ollama_client().embed([user_input])[0]
+        except OllamaError:
+            return None
+        start = time.perf_counter()
+        hits = get_corpus().search(query, top_k=top_k, doc_keys=doc_keys, per_document=2)
+        get_metrics().observe("corpus_search_seconds", time.perf_counter() - start)
+        excerpts, used = [], 0
+        for hit in hits:
+            text = f"[{hit['filename']}, chunk {hit['chunk'] + 1}]\n{hit['text']}"
+            if used + estimate_tokens(text) > token_budget:
+                continue
+            excerpts.append(text)
+            used += estimate_tokens(text)
+        if not excerpts:
+            return None
+        documents = len({hit["doc_key"] for hit in hits})
+        return (f"Excerpts from {documents} document{'s' if documents != 1 else ''} in the contract library, most relevant first. "
+                "Say which document each point comes from.\n\n" + "\n\n".join(excerpts) + f"\n\nUser: {user_input}")
 
-    def get_response(self, user_input):
+    def ask_document(self, container, user_input, reply_tokens=512):
         """
-        Generate chatbot response using local Llama 3.2 model via Ollama
+        Answer a chat question, continuing this chat's model conversation (Ollama context) so the
+        document and earlier turns are not re-sent and re-evaluated on every question.
+        The conversation restarts with a full prompt once it would overflow MODEL_CONTEXT_TOKENS.
+        Standard questions already answered for the document (see PreparedAnswers) are replied to
+        at once; like library answers, they don't become part of the conversation.
         """
-        import requests
+        if self.chat_scope() != []:
+            # library questions span documents: answered on their own, outside this chat's conversation
+            prompt, _ = self.build_chat_prompt(user_input)
+            self.stream_reply(container, user_input, prompt)
+            return
 
-        try:
-            # Send request to Ollama API
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": "llama3.2",
-                    "prompt": user_input,
-                    "stream": False
-                },
-                timeout=180
-            )
+        doc = st.session_state.doc
+        answer = get_prepared_answers().get(doc["doc_key"], user_input) if doc else None
+        if answer is not None:
+            self.add_message("user", user_input)
+            self.add_message("assistant", answer)
+            return
 
-            # Handle API result
-            if response.status_code == 200:
-                # attempt to parse common response shapes
-                data = response.json()
-                if isinstance(data, dict):
-                    # common key "response"
-                    if "response" in data:
-                        return data["response"]
-                    # sometimes it's {"choices": [{"text": "..."}]}
-                    if "choices" in data and isinstance(data["choices"], list) and len(data["choices"]) > 0:
-                        c = data["choices"][0]
-                        return c.get("text") or c.get("message") or str(c)
-                    # fallback
-                    return str(data)
-                else:
-                    return str(data)
-            else:
-                return f" Ollama API Error: {response.status_code} - {response.text}"
+        convo = self.conversation()
+        prompt, pids = self.build_chat_prompt(user_input, sent=set(convo["sent"]) if convo else None)
+        if convo and len(convo["context"]) + estimate_tokens(prompt) + reply_tokens > MODEL_CONTEXT_TOKENS:
+            convo = None
+            prompt, pids = self.build_chat_prompt(user_input)
 
-        except requests.exceptions.ConnectionError:
-            return " Cannot connect to Ollama. Please ensure Ollama is running (`ollama serve`)."
+        final = {}
+        self.stream_reply(container, user_input, prompt, context=convo["context"] if convo else None,
+                          on_done=final.update)
+        if final.get("context"):
+            sent = set(convo["sent"]) if convo else set()
+            self.set_conversation({"context": final["context"], "sent": sorted(sent | set(pids))})
 
-        except Exception as e:
-            return f" Error generating response: {str(e)}"
+    def conversation(self):
+        """This chat's model conversation {"context": Ollama tokens, "sent": passage ids}, or None"""
+        handle = st.session_state.conversation_blob
+        if handle is None:
+            return None
+        convo = get_session_blobs().get(handle)
+        if convo is None:
+            chat = get_chat_store().get_session(st.session_state.chat_owner, st.session_state.current_chat)
+            convo = chat and chat["context"]
+            if convo:
+                get_session_blobs().put(st.session_state.memory_owner, convo, handle=handle)
+        return convo
 
-    # ------------------- NEW: extraction, chunking, temp-json, send-to-model -------------------
-    def extract_text_from_file(self, uploaded_file):
-        """
-        Extract text from uploaded file content. Supports txt, pdf, docx.
-        """
-        try:
-            raw = uploaded_file.read()
-            # ensure we can re-read this file later by rewinding
-            try:
-                uploaded_file.seek(0)
-            except Exception:
-                pass
-
-            name_lower = (uploaded_file.name or "").lower()
-            ctype = (uploaded_file.type or "").lower()
-
-            # TXT
-            if "text" in ctype or name_lower.endswith(".txt"):
-                try:
-                    return raw.decode("utf-8")
-                except:
-                    return raw.decode("latin-1", errors="ignore")
-
-            # PDF
-            if "pdf" in ctype or name_lower.endswith(".pdf"):
-                if PdfReader is None:
-                    return "[PDF extractor not available: PyPDF2 not installed]"
-                try:
-                    reader = PdfReader(io.BytesIO(raw))
-                    text = ""
-                    for p in reader.pages:
-                        page_text = p.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                    return text
-                except Exception as e:
-                    return f"[PDF extraction error] {str(e)}"
-
-            # DOCX
-            if name_lower.endswith(".docx") or "word" in ctype or name_lower.endswith(".doc"):
-                if Document is None:
-                    return "[DOCX extractor not available: python-docx not installed]"
-                try:
-                    doc = Document(io.BytesIO(raw))
-                    paragraphs = [p.text for p in doc.paragraphs]
-                    return "\n".join(paragraphs)
-                except Exception as e:
-                    return f"[DOCX extraction error] {str(e)}"
-
-            return "[Unsupported file type]"
-
-        except Exception as ex:
-            return f"[Extraction failed] {str(ex)}"
-
-    def chunk_text(self, text, chunk_size=400):
-        """Word-based chunker"""
-        if not text:
-            return []
-        words = text.split()
-        chunks = [" ".join(words[i:i+chunk_size]) for i in range(0, len(words), chunk_size)]
-        return chunks
-
-    def create_temp_json(self, filename, chunks):
-        """Create temporary json file containing filename + chunks; return path"""
-        tmp = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json", prefix="clauseease_", encoding="utf-8")
-        json_obj = {"filename": filename, "created_at": datetime.now().isoformat(), "chunks_count": len(chunks), "chunks": chunks}
-        json.dump(json_obj, tmp, ensure_ascii=False, indent=2)
-        tmp.close()
-        return tmp.name
-
-    def process_uploaded_document(self, uploaded_file, chunk_size=400):
+    def keep_conversation(self, convo):
+        """Hold convo in the blob store as this session's conversation (without persisting it)"""
+        blobs = get_session_blobs()
+        if st.session_state.get("conversation_blob"):
+            blobs.discard(st.session_state.conversation_blob)
+        st.session_state.conversation_blob = blobs.put(st.session_state.memory_owner, convo) if convo else None
+
+    def set_conversation(self, convo):
+        self.keep_conversation(convo)
+        get_chat_store().set_context(st.session_state.current_chat, convo)
+
+    def process_uploaded_document(self, uploaded_file, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                                  max_workers=SUMMARY_WORKERS):
         """
-        Full pipeline called when user uploads a file:
-        extract -> chunk -> temp json -> send each chunk to Ollama (get summary) -> merge summaries
+        Queue the upload for the background workers (see DocumentJobQueue); the result is loaded
+        into the session by collect_document_jobs once the job finishes
         """
         if uploaded_file is None:
-            return {"success": False, "error": "No file"}
+            return None
 
-        filename = uploaded_file.name
-        # guard: skip re-processing same filename in same session
-        if filename in st.session_state.processed_files:
-            return {"success": True, "message": "Already processed in this session."}
+        # guard: each upload is processed once per chat (the chunk store and summary cache make a
+        # repeat in another chat cheap); a cancelled or failed one isn't retried while still in the uploader
+        handled = (st.session_state.current_chat, self.upload_key(uploaded_file))
+        if handled in st.session_state.handled_uploads:
+            return None
+        st.session_state.handled_uploads.add(handled)
 
-        # mark processing
-        st.session_state.processing_doc = True
+        job = get_job_queue().submit(uploaded_file, max_tokens=max_tokens, overlap_tokens=overlap_tokens,
+                                     max_workers=max_workers, chat_id=st.session_state.current_chat)
+        st.session_state.doc_jobs[job.id] = uploaded_file.name
+        return job
 
-        try:
-            extracted = self.extract_text_from_file(uploaded_file)
-
-            # Basic checks
-            if not extracted or extracted.strip() == "" or extracted.startswith("["):
-                return {"success": False, "error": f"Extraction error or empty content: {extracted}"}
-
-            # chunk
-            chunks = self.chunk_text(extracted, chunk_size=chunk_size)
-            if not chunks:
-                return {"success": False, "error": "No chunks created (empty text)."}
-
-            # save temp json
-            json_path = self.create_temp_json(filename, chunks)
-
-            # send each chunk to Ollama and collect short summaries
-            chunk_summaries = []
-            total = len(chunks)
-            for idx, ch in enumerate(chunks):
-                # short summarization prompt for chunk
-                prompt = (
-                    f"You are ClauseEase assistant. Summarize the following document chunk in 2-4 short sentences. "
-                    f"List any key obligations, deadlines, or party duties if present.\n\nChunk ({idx+1}/{total}):\n{ch}\n\nSummary:"
-                )
-                summary = self.get_response(prompt)
-                # fallback if no response
-                if not summary:
-                    summary = "[No summary returned]"
-                chunk_summaries.append({"index": idx, "summary": summary})
+    def upload_key(self, uploaded_file):
+        """Identity of one upload: Streamlit's file id, new on every upload, else a hash of the content"""
+        return getattr(uploaded_file, "file_id", None) or hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+    def collect_document_jobs(self):
+        """
+        Apply finished background jobs to the chat each was uploaded in, loading the document
+        if that chat is still the current one; returns True if any finished
+        """
+        jobs = get_job_queue()
+        store = get_chat_store()
+        collected = False
+        for job_id, filename in list(st.session_state.doc_jobs.items()):
+            job = jobs.get(job_id)
+            if job is not None and job.active:
+                continue
+            del st.session_state.doc_jobs[job_id]
+            jobs.discard(job_id)
+            collected = True
+            chat_id = job.chat_id if job is not None and job.chat_id else st.session_state.current_chat
+            current = chat_id == st.session_state.current_chat
 
-            # merge summaries into a single doc memory
-            merged = "\n\n".join([f"Chunk {c['index']+1} summary:\n{c['summary']}" for c in chunk_summaries])
-            st.session_state.doc_memory = merged
-            st.session_state.processed_files.add(filename)
+            def post(text):
+                if current:
+                    self.add_message("assistant", text)
+                else:
+                    store.add_message(chat_id, "assistant", text)
 
-            return {"success": True, "json_path": json_path, "chunks": len(chunks), "merged_preview": merged[:2000]}
+            if job is None:
+                post(f"Document processing for {filename} was lost (server restarted?). Please upload it again.")
+                continue
+            if job.status in ("cancelled", "failed"):
+                if job.status == "cancelled":
+                    post(f"⏹️ Processing of {filename} was cancelled.")
+                else:
+                    post(f"Document processing failed: {job.result.get('error')}")
+                continue
 
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-        finally:
-            st.session_state.processing_doc = False
+            result = job.result
+            doc = {"filename": filename, "doc_key": result["doc_key"],
+                   "merged": result["merged"], "levels": result["levels"]}
+            store.set_doc(chat_id, doc)
+            if current:
+                self.load_doc(doc, chat_id, index=job.index)
+                # the model conversation was about the previous document
+                self.set_conversation(None)
+            else:
+                get_doc_index_cache().put(result["doc_key"], job.index)
+                store.set_context(chat_id, None)
+                st.toast(f"📄 {filename} is ready in the conversation it was uploaded in.")
+
+            chunks = len(result["chunk_texts"])
+            preview_short = result["merged"][:SUMMARY_TARGET_CHARS]  # limit size shown in one message
+            failed = result["failed_chunks"]
+            if result["cache_hits"]:
+                preview_short += f"\n\n♻️ {result['cache_hits']} of {chunks} chunk summaries reused from cache."
+            if result["dedup_hits"]:
+                preview_short += f"\n\n🔁 {result['dedup_hits']} near-duplicate chunks reused an existing summary (model calls avoided)."
+            if result["local_summaries"]:
+                preview_short += (f"\n\n⏭️ {result['local_summaries']} low-value chunks (signature blocks, definitions, "
+                                  "headings) summarized without the model.")
+            if result["clause_index"]:
+                preview_short += "\n\n🏷️ Clause types: " + ", ".join(
+                    f"{t.replace('_', ' ')} ({len(ids)})" for t, ids in sorted(
+                        result["clause_index"].items(), key=lambda item: -len(item[1])))
+            if failed:
+                preview_short += f"\n\n⚠️ {len(failed)} of {chunks} chunks could not be summarized: " + ", ".join(str(i + 1) for i in failed)
+            if result.get("corpus_error"):
+                preview_short += f"\n\n📚 Not added to the document library: {result['corpus_error']}"
+            post(f"**📄 Document processed: {filename}**\n\n{preview_short}")
+            if current:
+                st.session_state.doc_summary_shown = True
+        return collected
+
+    @st.fragment(run_every=1.0)
+    def render_document_jobs(self):
+        """Live progress of this session's background jobs; reruns the app when one finishes"""
+        jobs = get_job_queue()
+        for job_id, filename in list(st.session_state.doc_jobs.items()):
+            job = jobs.get(job_id)
+            if job is None or not job.active:
+                st.rerun()
+            if job.status == "queued":
+                st.progress(0.0, text=f"{filename}: waiting for a worker...")
+            elif job.total is None:
+                # still extracting: how many chunks there are isn't known yet, so no bar or ETA
+                st.caption(f"⏳ {filename}: reading document · {job.done} chunks summarized so far")
+            elif job.total:
+                if job.stage == "summarize":
+                    label = "Summarized"
+                elif job.stage == "embed":
+                    label = "Adding to library:"
+                else:
+                    label = f"Merging summaries ({job.stage}):"
+                eta = job.eta()
+                text = f"{filename}: {label} {job.done}/{job.total} chunks" + (f" · ~{eta:.0f}s left" if eta is not None else "")
+                st.progress(min(1.0, job.done / job.total), text=text)
+            else:
+                st.progress(0.0, text=f"{filename}: reading document...")
+            if st.button("Cancel", key=f"cancel_{job_id}", use_container_width=True, disabled=job.cancel_event.is_set()):
+                job.cancel()
 
     # ------------------- Sidebar & main UI rendering -------------------
     def render_sidebar(self):
@@ -521,24 +578,18 @@ class UniqueClauseEase:
 
             # New Chat Button
             if st.button(" New Conversation", use_container_width=True):
-                new_chat_id = f"chat_{len(st.session_state.chat_sessions) + 1}"
-                st.session_state.chat_sessions[new_chat_id] = {
-                    "name": f"Chat {len(st.session_state.chat_sessions) + 1}",
-                    "messages": [], "timestamp": datetime.now()
-                }
-                st.session_state.current_chat = new_chat_id
-                st.session_state.messages = []
+                owner = st.session_state.chat_owner
+                store = get_chat_store()
+                self.open_chat(store.create_session(owner, f"Chat {store.count_sessions(owner) + 1}"))
                 st.rerun()
 
             st.markdown("---")
 
             # Chat History
             st.markdown("### 💬 Conversations")
-            for chat_id, chat_data in sorted(
-                st.session_state.chat_sessions.items(),
-                key=lambda x: x[1]["timestamp"],
-                reverse=True
-            )[:6]:
+            st.caption("🔗 Anyone with this page's link can open these chats.")
+            for chat_data in get_chat_store().list_sessions(st.session_state.chat_owner, limit=6):
+                chat_id = chat_data["id"]
                 is_active = chat_id == st.session_state.current_chat
                 emoji = "🔵" if is_active else "⚪"
 
@@ -548,8 +599,7 @@ class UniqueClauseEase:
                     use_container_width=True,
                     type="primary" if is_active else "secondary"
                 ):
-                    st.session_state.current_chat = chat_id
-                    st.session_state.messages = chat_data["messages"]
+                    self.open_chat(get_chat_store().get_session(st.session_state.chat_owner, chat_id))
                     st.rerun()
 
             st.markdown("---")
@@ -565,34 +615,28 @@ class UniqueClauseEase:
             )
             st.markdown('</div>', unsafe_allow_html=True)
 
-            # NEW: Immediately process uploaded file (only once per filename per session)
-            if uploaded_file is not None:
+            # NEW: Immediately process uploaded file (once per upload and chat, see process_uploaded_document);
+            # the chat stays usable while it runs
+            if uploaded_file is not None and self.process_uploaded_document(uploaded_file) is not None:
                 # only append lightweight metadata to uploaded_files to show in sidebar
-                if uploaded_file.name not in [f["filename"] for f in st.session_state.uploaded_files]:
-                    file_meta = {
-                        "filename": uploaded_file.name,
-                        "upload_time": datetime.now().strftime("%H:%M"),
-                        "size": f"{(uploaded_file.size / 1024):.1f} KB",
-                        "icon": "📄"
-                    }
-                    st.session_state.uploaded_files.append(file_meta)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": f"**📎 File Uploaded Successfully!**\n\n• **File:** {file_meta.get('filename', 'Unknown')}\n• **Time:** {file_meta.get('upload_time', 'Unknown')}\n• **Size:** {file_meta.get('size', 'Unknown')}\n• **Status:** ✅ Ready for analysis\n\nI'm processing the document now (extract → json → chunk → model). Please wait a moment..."
-                    })
-
-                # call the pipeline if not already processed
-                if uploaded_file.name not in st.session_state.processed_files and not st.session_state.processing_doc:
-                    info = self.process_uploaded_document(uploaded_file, chunk_size=400)
-                    if info.get("success"):
-                        # Append the document summary as an assistant message (main chat)
-                        merged_preview = st.session_state.doc_memory
-                        preview_short = merged_preview[:4000]  # limit size shown in one message
-                        st.session_state.messages.append({"role": "assistant", "content": f"**📄 Document processed: {uploaded_file.name}**\n\n{preview_short}"})
-                        st.rerun()
-                    else:
-                        st.session_state.messages.append({"role": "assistant", "content": f"Document processing failed: {info.get('error')}"})
-                        st.rerun()
+                file_meta = {
+                    "filename": uploaded_file.name,
+                    "upload_time": datetime.now().strftime("%H:%M"),
+                    "size": f"{(uploaded_file.size / 1024):.1f} KB",
+                    "icon": "📄"
+                }
+                st.session_state.uploaded_files.append(file_meta)
+                self.add_message(
+                    "assistant",
+                    f"**📎 File Uploaded Successfully!**\n\n• **File:** {file_meta.get('filename', 'Unknown')}\n• **Time:** {file_meta.get('upload_time', 'Unknown')}\n• **Size:** {file_meta.get('size', 'Unknown')}\n• **Status:** ✅ Ready for analysis\n\nI'm processing the document in the background (extract → chunk → summarize). You can keep chatting while it runs."
+                )
+
+            if st.session_state.doc_jobs:
+                self.render_document_jobs()
+
+            corpus = get_corpus()
+            if corpus is not None and corpus.has_documents():
+                self.render_library(corpus)
 
             st.markdown("---")
             # Quick Actions
@@ -601,18 +645,334 @@ class UniqueClauseEase:
             col1, col2 = st.columns(2)
             with col1:
                 if st.button(" Help", use_container_width=True):
-                    st.session_state.messages.append({"role": "user", "content": "help"})
-                    response = self.get_response("help")
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    self.add_message("user", HELP_PROMPT)
+                    self.add_message("assistant", self.canned_reply(HELP_PROMPT))
                     st.rerun()
             with col2:
                 if st.button(" Example", use_container_width=True):
-                    example = "simplify Either party may terminate this agreement with a thirty (30) days written notice to the other party"
-                    st.session_state.messages.append({"role": "user", "content": example})
-                    response = self.get_response(example)
-                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    self.add_message("user", EXAMPLE_PROMPT)
+                    self.add_message("assistant", self.canned_reply(EXAMPLE_PROMPT))
                     st.rerun()
 
+            st.markdown("---")
+            self.render_diagnostics()
+
+    def render_library(self, corpus):
+        """Document library: choose which documents chat questions are about, or remove one"""
+        docs = corpus.documents()
+        names = {d["doc_key"]: d["filename"] for d in docs}
+        # drop selections of documents removed since (e.g. from another session)
+        st.session_state.scope_docs = [k for k in st.session_state.get("scope_docs", []) if k in names]
+        with st.expander(f"📚 Document library ({len(docs)})"):
+            everything = st.checkbox("Ask about all documents", key="scope_all")
+            st.multiselect("Ask about", options=list(names), format_func=names.get, key="scope_docs",
+                           disabled=everything, placeholder="Current document")
+            remove = st.selectbox("Remove from library", [None] + list(names), key="library_remove",
+                                  format_func=lambda k: "—" if k is None else names[k])
+            if remove and st.button("🗑️ Remove", use_container_width=True):
+                corpus.remove(remove)
+                st.rerun()
+
+    def render_diagnostics(self):
+        """Sidebar panel with pipeline timings, model latency, errors and cache hit rate"""
+        with st.expander("🩺 Diagnostics"):
+            metrics = get_metrics()
+            snap = metrics.snapshot()
+
+            def ms(row, field):
+                return f"{row[field] * 1000:.0f} ms" if row else "–"
+
+            docs_ok = metrics.find(snap, "counters", "documents_total", status="ok")
+            docs_failed = metrics.find(snap, "counters", "documents_total", status="failed")
+            hit_ratio = metrics.find(snap, "gauges", "summary_cache_hit_ratio")
+            st.caption(
+                f"Documents: {docs_ok['value'] if docs_ok else 0} ok, {docs_failed['value'] if docs_failed else 0} failed · "
+                f"Summary cache hit rate: {hit_ratio['value'] * 100 if hit_ratio else 0:.0f}%"
+            )
+
+            rows = ["| Stage | Runs | Avg | p95 |", "|---|---|---|---|"]
+            for stage in ("extract", "chunk", "chunk_store", "summarize", "reduce", "embed", "total"):
+                row = metrics.find(snap, "summaries", "stage_seconds", stage=stage)
+                if row:
+                    rows.append(f"| {stage} | {row['count']} | {ms(row, 'avg')} | {ms(row, 'p95')} |")
+            for mode in ("generate", "stream"):
+                row = metrics.find(snap, "summaries", "model_request_seconds", mode=mode)
+                if row:
+                    rows.append(f"| model ({mode}) | {row['count']} | {ms(row, 'avg')} | {ms(row, 'p95')} |")
+            search = metrics.find(snap, "summaries", "corpus_search_seconds")
+            if search:
+                rows.append(f"| library search | {search['count']} | {ms(search, 'avg')} | {ms(search, 'p95')} |")
+            ttft = metrics.find(snap, "summaries", "model_first_token_seconds")
+            if ttft:
+                rows.append(f"| first token | {ttft['count']} | {ms(ttft, 'avg')} | {ms(ttft, 'p95')} |")
+            for run in ("first", "rerun"):
+                row = metrics.find(snap, "summaries", "script_run_seconds", run=run)
+                if row:
+                    rows.append(f"| script run ({run}) | {row['count']} | {ms(row, 'avg')} | {ms(row, 'p95')} |")
+            st.markdown("\n".join(rows))
+
+            over = [r for r in snap["counters"] if r["name"] == "script_run_over_budget_total"]
+            last = st.session_state.get("last_script_run_ms")
+            st.caption(
+                (f"Last script run: {last:.0f} ms · " if last is not None else "")
+                + f"Budget: {RERUN_BUDGET_MS:.0f} ms"
+                + (" · Over budget: " + ", ".join(f"{r['labels']['run']} {r['value']}" for r in over) if over else "")
+            )
+
+            errors = [r for r in snap["counters"] if r["name"] == "model_errors_total"]
+            if errors:
+                st.caption("Model errors: " + ", ".join(f"{r['labels']['kind']} {r['value']}" for r in errors))
+            prepared = [r for r in snap["counters"] if r["name"] == "prepared_answers_total"]
+            if prepared:
+                st.caption("Standard questions: " + ", ".join(f"{r['labels']['result']} {r['value']}" for r in prepared))
+
+            # memory: this session's state and compressed blobs, then the process-wide stores
+            def kb(n):
+                return f"{n / 1024:.0f} KB" if n < 2 ** 20 else f"{n / 2 ** 20:.1f} MB"
+
+            state = self.session_memory()
+            mine = get_session_blobs().usage(st.session_state.memory_owner)
+            blobs = get_session_blobs().usage()
+            indexes = get_doc_index_cache().usage()
+            rows = ["| Session memory | Size |", "|---|---|"]
+            rows += [f"| {key} | {kb(size)} |" for key, size in state[:5]]
+            rows.append(f"| compressed blobs ({mine['blobs']}) | {kb(mine['bytes'])} of {kb(mine['raw_bytes'])} |")
+            st.markdown("\n".join(rows))
+            st.caption(
+                f"Session state: {kb(sum(size for _, size in state))} of {SESSION_MEMORY_MB:g} MB · "
+                f"All sessions: {blobs['sessions']}, {kb(blobs['bytes'])} of {SESSION_STORE_MB:g} MB compressed, "
+                f"{blobs['evictions']} evicted · Document indexes: {indexes['indexes']}, "
+                f"{kb(indexes['bytes'])} of {DOC_INDEX_CACHE_MB:g} MB"
+            )
+            corpus = get_corpus()
+            if corpus is not None:
+                library = corpus.usage()
+                st.caption(f"Document library: {library['documents']} documents, {library['rows']} chunks, "
+                           f"{kb(library['bytes'])} memory-mapped ({library['dtype']})")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("Prometheus", metrics.to_prometheus(snap), file_name="clauseease_metrics.prom",
+                                   mime="text/plain", use_container_width=True)
+            with col2:
+                st.download_button("JSON", json.dumps(snap, indent=2), file_name="clauseease_metrics.json",
+                                   mime="application/json", use_container_width=True)
+
+    def get_response(self, user_input, on_token=None, context=None, on_done=None):
+        # runs that call the model are timed separately from the rerun budget
+        self.waited_on_model = True
+        return super().get_response(user_input, on_token=on_token, context=context, on_done=on_done)
+
+    def session_memory(self):
+        """[(session-state key, estimated bytes)], largest first"""
+        sizes = [(key, estimate_size(st.session_state[key])) for key in list(st.session_state.keys())]
+        return sorted(sizes, key=lambda item: -item[1])
+
+    def enforce_memory_budget(self):
+        """Past SESSION_MEMORY_MB in session state, let go of loaded messages beyond the latest page"""
+        used = sum(size for _, size in self.session_memory())
+        messages = st.session_state.messages
+        if used > SESSION_MEMORY_MB * 2 ** 20 and len(messages) > CHAT_PAGE_SIZE:
+            self.drop_messages(messages[:-CHAT_PAGE_SIZE])
+            del messages[:-CHAT_PAGE_SIZE]
+            st.session_state.chat_window = CHAT_PAGE_SIZE
+            get_metrics().inc("session_memory_trims_total")
+
+    def record_script_run(self, first_run):
+        """Time this script run against RERUN_BUDGET_MS"""
+        seconds = time.perf_counter() - _SCRIPT_STARTED
+        st.session_state.last_script_run_ms = seconds * 1000
+        run = "model" if self.waited_on_model else ("first" if first_run else "rerun")
+        metrics = get_metrics()
+        metrics.observe("script_run_seconds", seconds, run=run)
+        if run != "model" and seconds * 1000 > RERUN_BUDGET_MS:
+            metrics.inc("script_run_over_budget_total", run=run)
+
+    def open_chat(self, chat):
+        """
+        Make a stored chat session current: load its latest page of messages and, if a document
+        was processed in it, that document's summaries and search index
+        """
+        st.session_state.current_chat = chat["id"]
+        self.drop_messages(st.session_state.get("messages", ()))
+        st.session_state.messages = [self.compact_message(m) for m in get_chat_store().messages(chat["id"])]
+        st.session_state.chat_window = CHAT_PAGE_SIZE   # how many recent messages are kept and rendered
+        # whether a "Document processed" message is in this chat; kept up to date on append
+        st.session_state.doc_summary_shown = bool(chat["doc"])
+        self.keep_conversation(chat["context"])
+        if chat["doc"]:
+            self.load_doc(chat["doc"], chat["id"])
+            # a file left in the uploader goes to chats without a document, never over this one's
+            uploaded = st.session_state.get("file_uploader")
+            if uploaded is not None:
+                st.session_state.handled_uploads.add((chat["id"], self.upload_key(uploaded)))
+        elif st.session_state.get("doc"):
+            # the previous chat's document doesn't carry over
+            get_session_blobs().discard(st.session_state.doc["blob"])
+            st.session_state.doc = None
+
+    def load_doc(self, doc, chat_id, index=None):
+        """
+        Make doc ({"filename", "doc_key", "merged", "levels"}, stored with chat chat_id) the current
+        document. Its summaries go to the blob store; the search index is built when first needed.
+        """
+        blobs = get_session_blobs()
+        if st.session_state.doc:
+            blobs.discard(st.session_state.doc["blob"])
+        handle = blobs.put(st.session_state.memory_owner, {"merged": doc["merged"], "levels": doc["levels"]})
+        st.session_state.doc = {"filename": doc.get("filename"), "doc_key": doc["doc_key"], "chat": chat_id,
+                                "blob": handle}
+        if index is not None:
+            get_doc_index_cache().put(doc["doc_key"], index)
+
+    def doc_summaries(self):
+        """{"merged", "levels"} of the current document (reloaded from the chat store if evicted), or None"""
+        doc = st.session_state.doc
+        if not doc:
+            return None
+        summaries = get_session_blobs().get(doc["blob"])
+        if summaries is None:
+            chat = get_chat_store().get_session(st.session_state.chat_owner, doc["chat"])
+            if not chat or not chat["doc"]:
+                return None
+            summaries = {"merged": chat["doc"]["merged"], "levels": chat["doc"]["levels"]}
+            get_session_blobs().put(st.session_state.memory_owner, summaries, handle=doc["blob"])
+        return summaries
+
+    def doc_index(self):
+        """The current document's search index, shared by sessions and rebuilt from the chunk store if evicted"""
+        doc = st.session_state.doc
+        if not doc:
+            return None
+        cache = get_doc_index_cache()
+        index = cache.get(doc["doc_key"])
+        if index is None:
+            summaries = self.doc_summaries()
+            index = self.restore_doc_index({"doc_key": doc["doc_key"], "levels": summaries["levels"]}) if summaries else None
+            if index is not None:
+                cache.put(doc["doc_key"], index)
+        return index
+
+    def restore_doc_index(self, doc):
+        """Rebuild a stored document's search index from the chunk store (None if it was cleaned up)"""
+        store = get_chunk_store()
+        if not store.has(doc["doc_key"]):
+            return None
+        reader = store.open(doc["doc_key"])
+        try:
+            chunks = [rec["text"] for rec in reader]
+        finally:
+            reader.close()
+        # documents stored before level 0 recorded "failed" carry the error in the summary text
+        summaries = [
+            {"index": e["first"], "summary": e["summary"],
+             "error": e.get("failed", e["summary"].startswith("[Summary failed:"))}
+            for e in doc["levels"][0]
+        ]
+        return self.build_doc_index(chunks, summaries)
+
+    def add_message(self, role, content):
+        """Append to the current chat; only the recent window stays in memory, the store keeps the rest"""
+        seq = get_chat_store().add_message(st.session_state.current_chat, role, content)
+        messages = st.session_state.messages
+        messages.append(self.compact_message({"seq": seq, "role": role, "content": content}))
+        if len(messages) > st.session_state.chat_window:
+            self.drop_messages(messages[:len(messages) - st.session_state.chat_window])
+            del messages[:len(messages) - st.session_state.chat_window]
+
+    def compact_message(self, message):
+        """Long message texts move to the blob store; the message keeps a handle instead of "content" """
+        if len(message["content"]) <= LONG_MESSAGE_CHARS:
+            return message
+        handle = get_session_blobs().put(st.session_state.memory_owner, {"content": message["content"]})
+        return {"seq": message["seq"], "role": message["role"], "blob": handle}
+
+    def drop_messages(self, messages):
+        """Release the blobs of messages leaving session state"""
+        blobs = get_session_blobs()
+        for message in messages:
+            if "blob" in message:
+                blobs.discard(message["blob"])
+
+    def clear_chat(self):
+        get_chat_store().clear(st.session_state.current_chat)
+        self.set_conversation(None)
+        self.drop_messages(st.session_state.messages)
+        st.session_state.messages = []
+        st.session_state.chat_window = CHAT_PAGE_SIZE
+        st.session_state.doc_summary_shown = False
+
+    def cached_message_html(self, message):
+        """
+        message_html, built once per message and kept on the message itself, or for a long
+        message next to its text in the blob store (reloaded from the chat store if evicted)
+        """
+        html = message.get("html")
+        if html is not None:
+            return html
+        if "blob" not in message:
+            html = message["html"] = self.message_html(message["role"], message["content"])
+            return html
+        blobs = get_session_blobs()
+        value = blobs.get(message["blob"])
+        if value is None:
+            stored = get_chat_store().messages(st.session_state.current_chat, before=message["seq"] + 1, limit=1)
+            value = {"content": stored[0]["content"] if stored else ""}
+        if value.get("html") is None:
+            value["html"] = self.message_html(message["role"], value["content"])
+            blobs.put(st.session_state.memory_owner, value, handle=message["blob"])
+        return value["html"]
+
+    def message_html(self, role, content):
+        """HTML for one chat bubble"""
+        if role == "user":
+            return f"""
+                    <div class="user-message">
+                        <div style="font-weight: 600; margin-bottom: 8px;">You</div>
+                        <div>{content}</div>
+                    </div>
+                    """
+        return f"""
+                    <div class="assistant-message">
+                        <div style="font-weight: 600; margin-bottom: 8px;">ClauseEase AI</div>
+                        <div>{content}</div>
+                    </div>
+                    """
+
+    def stream_reply(self, container, shown_input, prompt, context=None, on_done=None):
+        """
+        Show the user's message, then stream the model reply into an assistant bubble
+        token by token. Both messages are appended to the chat history; returns the reply.
+        """
+        self.add_message("user", shown_input)
+        with container:
+            st.markdown(self.message_html("user", shown_input), unsafe_allow_html=True)
+            bubble = st.empty()
+        bubble.markdown(self.message_html("assistant", "…"), unsafe_allow_html=True)
+
+        # repainting on every token floods the websocket; ~20 updates/s is smooth enough
+        last_paint = [0.0]
+
+        def on_token(text_so_far):
+            now = time.monotonic()
+            if now - last_paint[0] >= 0.05:
+                last_paint[0] = now
+                bubble.markdown(self.message_html("assistant", text_so_far + " ▌"), unsafe_allow_html=True)
+
+        response = self.get_response(prompt, on_token=on_token, context=context, on_done=on_done)
+        bubble.markdown(self.message_html("assistant", response), unsafe_allow_html=True)
+        self.add_message("assistant", response)
+        return response
+
+    def canned_reply(self, prompt):
+        """Precomputed reply for a quick-action prompt, or a live one (which is then cached)"""
+        canned = get_canned_responses()
+        reply = canned.get(prompt)
+        if reply is None:
+            reply = self.get_response(prompt)
+            canned.put(prompt, reply)
+        return reply
+
     def render_main_chat(self):
         """Render the main chat interface"""
         # Unique header
@@ -629,27 +989,23 @@ class UniqueClauseEase:
         chat_container = st.container()
 
         with chat_container:
-            # Display messages
-            for message in st.session_state.messages:
-                if message["role"] == "user":
-                    st.markdown(f"""
-                    <div class="user-message">
-                        <div style="font-weight: 600; margin-bottom: 8px;">You</div>
-                        <div>{message["content"]}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="assistant-message">
-                        <div style="font-weight: 600; margin-bottom: 8px;">ClauseEase AI</div>
-                        <div>{message["content"]}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+            # Only the most recent window of messages is loaded; older pages come from the store on demand
+            messages = st.session_state.messages
+            hidden = messages[0]["seq"] if messages else 0
+            if hidden:
+                if st.button(f"⬆️ Load older messages ({hidden} hidden)", key="load_older", use_container_width=True):
+                    older = get_chat_store().messages(st.session_state.current_chat, before=hidden)
+                    messages[:0] = [self.compact_message(m) for m in older]
+                    st.session_state.chat_window = len(messages)
+                    st.rerun()
+            for message in messages:
+                st.markdown(self.cached_message_html(message), unsafe_allow_html=True)
 
-            # If doc_memory exists but no message was added (edge case), show it once here
+            # If a document summary exists but no message was added (edge case), show it once here
             # (Usually we appended merged summary into messages during processing)
-            if st.session_state.get("doc_memory", "").strip() and not any("Document processed" in (m.get("content","") if m.get("role")=="assistant" else "") for m in st.session_state.messages):
-                preview_short = st.session_state.doc_memory[:4000]
+            summaries = self.doc_summaries()
+            if summaries and summaries["merged"].strip() and not st.session_state.doc_summary_shown:
+                preview_short = summaries["merged"][:SUMMARY_TARGET_CHARS]
                 st.markdown(f"""
                 <div class="assistant-message">
                     <div style="font-weight: 600; margin-bottom: 8px;">ClauseEase AI</div>
@@ -657,6 +1013,18 @@ class UniqueClauseEase:
                 </div>
                 """, unsafe_allow_html=True)
 
+            # More detail than the top-level summary: browse the intermediate merge levels
+            levels = summaries["levels"] if summaries else []
+            if len(levels) > 1:
+                with st.expander("📚 Document summary by level of detail"):
+                    depth = st.select_slider(
+                        "Detail",
+                        options=list(range(len(levels) - 1, -1, -1)),
+                        format_func=lambda d: "Overview" if d == len(levels) - 1 else ("Per chunk" if d == 0 else f"Level {d}"),
+                        key="doc_level_view",
+                    )
+                    st.markdown(self.format_summary_level(levels[depth]))
+
             # Empty space for new messages
             if not st.session_state.messages:
                 st.markdown("""
@@ -683,53 +1051,58 @@ class UniqueClauseEase:
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("Clear Chat", use_container_width=True):
-                st.session_state.messages = []
+                self.clear_chat()
                 st.rerun()
         with col2:
             if st.button("More Examples", use_container_width=True):
-                examples = [
-                    "simplify Notwithstanding anything to the contrary herein",
-                    "What does indemnification mean?",
-                    "Explain termination clauses in simple terms"
-                ]
-                import random
-                example = random.choice(examples)
-                st.session_state.messages.append({"role": "user", "content": example})
-                response = self.get_response(example)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                example = random.choice(MORE_EXAMPLE_PROMPTS)
+                reply = get_canned_responses().get(example)
+                if reply is not None:
+                    self.add_message("user", example)
+                    self.add_message("assistant", reply)
+                else:
+                    get_canned_responses().put(example, self.stream_reply(chat_container, example, example))
                 st.rerun()
         with col3:
             if st.button(" Simplify", use_container_width=True) and user_input:
                 user_input = "simplify " + user_input
-                st.session_state.messages.append({"role": "user", "content": user_input})
-                response = self.get_response(user_input)
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                self.stream_reply(chat_container, user_input, user_input)
                 st.rerun()
 
-        if send_button and user_input:
-            st.session_state.messages.append({"role": "user", "content": user_input})
-            # include document memory as context if present
-            doc_ctx = st.session_state.get("doc_memory", "")
-            if doc_ctx:
-                prompt = doc_ctx + "\n\nUser: " + user_input
-            else:
-                prompt = user_input
+        # Standard questions about the current document; ⚡ ones were answered in the background already
+        doc = st.session_state.doc
+        if doc and STANDARD_QUESTIONS and self.chat_scope() == []:
+            ready = get_prepared_answers().answered(doc["doc_key"])
+            cols = st.columns(min(len(STANDARD_QUESTIONS), 4))
+            for i, question in enumerate(STANDARD_QUESTIONS):
+                with cols[i % len(cols)]:
+                    label = ("⚡ " if question in ready else "") + question
+                    if st.button(label, key=f"standard_question_{i}", use_container_width=True):
+                        self.ask_document(chat_container, question)
+                        st.rerun()
 
-            response = self.get_response(prompt)
-            st.session_state.messages.append({"role": "assistant", "content": response})
+        if send_button and user_input:
+            # include the relevant parts of the document as context if one is loaded
+            self.ask_document(chat_container, user_input)
             st.rerun()
 
     def run(self):
-        # Update current chat session
-        if st.session_state.current_chat in st.session_state.chat_sessions:
-            st.session_state.chat_sessions[st.session_state.current_chat]["messages"] = st.session_state.messages
+        first_run = "script_runs" not in st.session_state
+        st.session_state.script_runs = st.session_state.get("script_runs", 0) + 1
+        try:
+            self.collect_document_jobs()
 
-        # Render layout
-        self.render_sidebar()
-        self.render_main_chat()
+            # Render layout
+            self.render_sidebar()
+            self.render_main_chat()
+            self.enforce_memory_budget()
+        finally:
+            # new messages of this run (st.rerun() raises, so this also covers reruns)
+            get_chat_store().flush()
+            self.record_script_run(first_run)
 
 
 # Run the app
 if __name__ == "__main__":
     app = UniqueClauseEase()
-    app.run()
+    app.run()
\ No newline at end of file
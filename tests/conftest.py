@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# settings are read at import time: keep metrics and stores out of the user's ~/.clauseease
+os.environ.setdefault("CLAUSEEASE_HOME", tempfile.mkdtemp(prefix="clauseease-tests-"))
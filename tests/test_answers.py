@@ -0,0 +1,22 @@
+import pytest
+
+from clauseease.answers import PreparedAnswers
+
+QUESTIONS = ["What are the termination conditions?", "What are the payment terms?"]
+
+
+@pytest.fixture
+def answers(tmp_path):
+    return PreparedAnswers(str(tmp_path / "answers.sqlite3"), questions=QUESTIONS, threshold=0.5)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What are the termination conditions?", QUESTIONS[0]),
+    ("termination conditions please", QUESTIONS[0]),
+    ("List all the payment terms in the contract", QUESTIONS[1]),
+    ("What are the termination conditions for the supplier?", None),
+    ("Can I terminate early?", None),
+    ("Summarize the contract", None),
+])
+def test_match_only_when_nothing_more_is_asked(answers, question, expected):
+    assert answers.match(question) == expected
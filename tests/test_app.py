@@ -0,0 +1,39 @@
+import os
+import runpy
+
+from clauseease import ollama
+from clauseease.pipeline import ClauseEasePipeline
+from clauseease.stores import get_chunk_store
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "clauseease_chatbot.py")
+
+
+def test_reruns_share_the_package_classes():
+    # Streamlit re-executes the page script on every rerun; errors raised by the cached client
+    # must still be caught by the next run's except clauses
+    first = runpy.run_path(APP)
+    second = runpy.run_path(APP)
+    assert first["OllamaError"] is second["OllamaError"] is ollama.OllamaError
+    assert issubclass(ollama.CircuitOpenError, second["OllamaError"])
+    assert first["ClauseEasePipeline"] is second["ClauseEasePipeline"] is ClauseEasePipeline
+    assert first["get_ollama_client"] is second["get_ollama_client"]
+
+
+def test_restored_index_leaves_out_failed_summaries():
+    app = runpy.run_path(APP)["UniqueClauseEase"]
+    ui = app.__new__(app)
+    store = get_chunk_store()
+    writer = store.writer("restore-test", "lease.txt")
+    writer.append(0, 21, "The tenant pays rent.")
+    writer.append(22, 49, "Either party may terminate.")
+    writer.close()
+    # level 0 as stored with the chat: with the "failed" flag, and from before it was recorded
+    for failed in ({"failed": True}, {}):
+        doc = {"doc_key": "restore-test", "levels": [[
+            {"summary": "Rent is due monthly.", "first": 0, "last": 0},
+            {"summary": "[Summary failed: timed out]", "first": 1, "last": 1, **failed},
+        ]]}
+        index = ui.restore_doc_index(doc)
+        assert index.passages[0]["fallback"] == "[Chunk 1 summary]\nRent is due monthly."
+        assert index.passages[1]["fallback"] is None
+        assert "Summary failed" not in index.passages[1]["search_text"]
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from clauseease.corpus import DocumentCorpus
+
+
+def unit(dim, i):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i] = 1
+    return v
+
+
+@pytest.fixture(params=[False, True], ids=["float32", "int8"])
+def int8(request):
+    return request.param
+
+
+def test_search_ranks_and_scopes(tmp_path, int8):
+    corpus = DocumentCorpus(str(tmp_path), int8=int8)
+    assert corpus.search(unit(4, 0)) == []
+    assert corpus.add("a", "a.pdf", ["a0", "a1"], [unit(4, 0), unit(4, 1)])
+    assert corpus.add("b", "b.pdf", ["b0"], [unit(4, 0) * 0.9 + unit(4, 2) * 0.1])
+    assert not corpus.add("a", "a.pdf", ["again"], [unit(4, 3)])
+
+    hits = corpus.search(unit(4, 0), top_k=2)
+    assert [(h["doc_key"], h["text"]) for h in hits] == [("a", "a0"), ("b", "b0")]
+    assert hits[0]["score"] == pytest.approx(1, abs=0.02)
+    assert [h["text"] for h in corpus.search(unit(4, 0), top_k=3, doc_keys=["b"])] == ["b0"]
+    assert corpus.search(unit(4, 0), doc_keys=["missing"]) == []
+    assert [h["doc_key"] for h in corpus.search(unit(4, 0), top_k=2, per_document=1)] == ["a", "b"]
+    assert {d["doc_key"] for d in corpus.documents()} == {"a", "b"}
+
+
+def test_dimension_must_match(tmp_path):
+    corpus = DocumentCorpus(str(tmp_path))
+    corpus.add("a", "a.pdf", ["a0"], [unit(4, 0)])
+    with pytest.raises(ValueError):
+        corpus.add("b", "b.pdf", ["b0"], [unit(8, 0)])
+    with pytest.raises(ValueError):
+        corpus.add("c", "c.pdf", ["c0", "c1"], [unit(4, 0)])
+
+
+def test_remove_and_compact(tmp_path, int8):
+    corpus = DocumentCorpus(str(tmp_path), int8=int8)
+    corpus.add("a", "a.pdf", ["a0", "a1"], [unit(4, 0), unit(4, 1)])
+    corpus.add("b", "b.pdf", ["b0", "b1"], [unit(4, 2), unit(4, 3)])
+    corpus.add("c", "c.pdf", ["c0"], [unit(4, 1)])
+    assert corpus.remove("a")
+    assert not corpus.remove("a")
+    assert corpus.usage()["dead_rows"] == 2
+    assert [h["text"] for h in corpus.search(unit(4, 1), top_k=1)] == ["c0"]
+
+    # more than half the rows dead: removing b compacts the matrix
+    corpus.remove("b")
+    usage = corpus.usage()
+    assert (usage["documents"], usage["rows"], usage["dead_rows"]) == (1, 1, 0)
+    assert usage["dtype"] == ("int8" if int8 else "float32")
+    assert [h["text"] for h in corpus.search(unit(4, 1), top_k=5)] == ["c0"]
+
+    reopened = DocumentCorpus(str(tmp_path), int8=not int8)
+    assert reopened.dtype == corpus.dtype
+    assert [h["text"] for h in reopened.search(unit(4, 1))] == ["c0"]
+
+
+def test_two_instances_share_a_library(tmp_path):
+    # two instances behave like two processes: separate connections, matrices and caches
+    app = DocumentCorpus(str(tmp_path))
+    batch = DocumentCorpus(str(tmp_path))
+    app.add("a", "a.pdf", ["a0"], [unit(4, 0)])
+    batch.add("b", "b.pdf", ["b0"], [unit(4, 1)])
+    app.add("c", "c.pdf", ["c0"], [unit(4, 2)])
+    for corpus in (app, batch):
+        assert {d["doc_key"] for d in corpus.documents()} == {"a", "b", "c"}
+        assert [corpus.search(unit(4, i), top_k=1)[0]["text"] for i in range(3)] == ["a0", "b0", "c0"]
+
+    batch.remove("a")
+    batch.remove("b")   # compacts: c's row moves
+    assert not app.has("a")
+    assert [h["text"] for h in app.search(unit(4, 2))] == ["c0"]
+    app.add("d", "d.pdf", ["d0"], [unit(4, 3)])
+    assert [batch.search(unit(4, i), top_k=1)[0]["text"] for i in (2, 3)] == ["c0", "d0"]
@@ -0,0 +1,30 @@
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+from clauseease import pipeline
+from clauseease.extract import DocumentFile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from synthetic import make_pdf  # noqa: E402
+
+pytest.importorskip("PyPDF2")
+
+
+def test_pooled_pdf_extraction_keeps_page_order(monkeypatch):
+    monkeypatch.setattr(pipeline, "PDF_POOL_MIN_PAGES", 20)
+    monkeypatch.setattr(pipeline, "PDF_POOL_WORKERS", 2)
+    raw = make_pdf([f"Page {p} of the agreement." for p in range(45)])
+    out = {}
+
+    def extract():
+        out["text"] = "".join(pipeline.ClauseEasePipeline().iter_text_blocks(DocumentFile(raw, "long.pdf")))
+
+    # started off the main thread, as it is in the web UI's job queue
+    worker = threading.Thread(target=extract)
+    worker.start()
+    worker.join()
+    assert [int(n) for n in re.findall(r"Page (\d+) of", out["text"])] == list(range(45))
@@ -0,0 +1,34 @@
+from clauseease import jobs
+from clauseease.extract import DocumentFile
+
+
+def make_job(monkeypatch, clock):
+    monkeypatch.setattr(jobs.time, "time", lambda: clock[0])
+    job = jobs.DocumentJob(DocumentFile(b"text", "contract.txt"), 600, 60, 2)
+    job.status, job.stage, job.started = "running", "reading", clock[0]
+    job.stage_started = job.started
+    return job
+
+
+def test_eta_is_measured_from_the_start_of_the_current_stage(monkeypatch):
+    clock = [1000.0]
+    job = make_job(monkeypatch, clock)
+    job.on_progress("summarize", 0, 10)
+    clock[0] += 100
+    job.on_progress("summarize", 10, 10)
+    assert job.eta() is None
+
+    job.on_progress("level 1", 0, 3)
+    clock[0] += 5
+    job.on_progress("level 1", 1, 3)
+    assert job.eta() == 10
+
+
+def test_no_eta_while_the_document_is_still_being_read(monkeypatch):
+    clock = [1000.0]
+    job = make_job(monkeypatch, clock)
+    job.on_progress("summarize", 4, None)
+    clock[0] += 10
+    assert job.eta() is None
+    job.on_progress("summarize", 5, 20)
+    assert job.eta() == 30
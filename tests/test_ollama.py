@@ -0,0 +1,51 @@
+import pytest
+
+from clauseease.ollama import CircuitBreaker, CircuitOpenError, OllamaConnectionError
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(max_failures=3, cooldown=60)
+    for _ in range(2):
+        breaker.check()
+        breaker.failure()
+    breaker.success()
+    for _ in range(2):
+        breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_open_circuit_is_a_connection_error():
+    assert issubclass(CircuitOpenError, OllamaConnectionError)
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(max_failures=1, cooldown=0)
+    breaker.failure()
+    assert breaker.state == "half-open"
+    breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()     # second caller while the trial is running
+    breaker.success()
+    assert breaker.state == "closed"
+    breaker.check()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(max_failures=5, cooldown=0)
+    for _ in range(5):
+        breaker.failure()
+    breaker.check()
+    breaker.cooldown = 60
+    breaker.failure()
+    assert breaker.state == "open"
+
+
+def test_zero_max_failures_never_opens():
+    breaker = CircuitBreaker(max_failures=0, cooldown=60)
+    for _ in range(100):
+        breaker.failure()
+    assert breaker.state == "closed"
@@ -0,0 +1,70 @@
+from clauseease.pipeline import ClauseEasePipeline
+
+
+def contract(sections=6, sentences=8):
+    parts = []
+    for s in range(1, sections + 1):
+        body = " ".join(f"The Supplier must deliver item {s}.{i} on time." for i in range(sentences))
+        parts.append(f"{s}. SECTION {s}\n{body}")
+    return "\n\n".join(parts)
+
+
+def test_split_units_skips_abbreviations():
+    text = "Acme Inc. agrees to pay, e.g. fees. The Buyer accepts."
+    units = ClauseEasePipeline().split_units(text)
+    assert [text[s:e].strip() for s, e, _ in units] == ["Acme Inc. agrees to pay, e.g. fees.", "The Buyer accepts."]
+
+
+def test_chunks_fit_and_cover_the_text():
+    pipeline = ClauseEasePipeline()
+    text = contract()
+    spans = pipeline.chunk_spans(text, max_tokens=100, overlap_tokens=20)
+    assert len(spans) > 1
+    assert all(e - s <= 100 * 4 for s, e in spans)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    # consecutive chunks touch or overlap: nothing is dropped
+    assert all(b[0] <= a[1] + 2 for a, b in zip(spans, spans[1:]))
+    assert pipeline.chunk_text(text, 100, 20) == [text[s:e] for s, e in spans]
+
+
+def test_chunks_end_at_section_breaks_without_overlap_across_them():
+    pipeline = ClauseEasePipeline()
+    text = contract(sections=3, sentences=4)
+    section_len = len(text.split("\n\n")[0])
+    chunks = pipeline.chunk_text(text, max_tokens=section_len // 4 + 20, overlap_tokens=50)
+    assert chunks == text.split("\n\n")
+
+
+def test_oversized_sentence_is_cut():
+    pipeline = ClauseEasePipeline()
+    text = "word " * 500
+    chunks = pipeline.chunk_text(text, max_tokens=50, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    assert "".join(c + " " for c in chunks).split() == text.split()
+
+
+def test_empty_text_has_no_chunks():
+    assert ClauseEasePipeline().chunk_spans("  \n ") == []
+
+
+def test_iter_chunks_matches_chunk_spans():
+    pipeline = ClauseEasePipeline()
+    text = contract()
+    blocks = [text[i:i + 97] for i in range(0, len(text), 97)]
+    streamed = [(s, e) for s, e, _ in pipeline.iter_chunks(blocks, max_tokens=100, overlap_tokens=20)]
+    assert streamed == pipeline.chunk_spans(text, max_tokens=100, overlap_tokens=20)
+
+
+def test_failed_chunk_summaries_stay_out_of_the_index():
+    pipeline = ClauseEasePipeline()
+    summaries = [
+        {"index": 0, "summary": "Rent is due monthly.", "error": None},
+        {"index": 1, "summary": "[Summary failed: timed out]", "error": "timed out"},
+    ]
+    levels = pipeline.reduce_summaries(summaries)
+    assert [e["failed"] for e in levels[0]] == [False, True]
+
+    index = pipeline.build_doc_index(["The tenant pays rent.", "Either party may terminate."], summaries)
+    assert index.passages[1]["fallback"] is None
+    assert "failed" not in index.passages[1]["search_text"]
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from clauseease.stores import ChatStore, ChunkStore
+
+
+def write_doc(store, key, chunks):
+    writer = store.writer(key, "contract.txt")
+    for i, text in enumerate(chunks):
+        writer.append(i * 10, i * 10 + len(text), text)
+    writer.close()
+
+
+def test_chunk_store_round_trip(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    key = ChunkStore.doc_key(b"raw bytes", 800, 100)
+    assert key != ChunkStore.doc_key(b"raw bytes", 800, 0)
+    assert not store.has(key)
+    write_doc(store, key, ["First clause.", "Zweite Klausel — ü", ""])
+    assert store.has(key)
+    reader = store.open(key)
+    try:
+        assert len(reader) == 3
+        assert reader.meta["chunks_count"] == 3 and reader.meta["filename"] == "contract.txt"
+        assert reader[1] == {"start": 10, "end": 28, "text": "Zweite Klausel — ü"}
+        assert reader[-1]["text"] == ""
+        assert [c["text"] for c in reader] == ["First clause.", "Zweite Klausel — ü", ""]
+        with pytest.raises(IndexError):
+            reader[3]
+    finally:
+        reader.close()
+
+
+def test_unpublished_document_is_invisible(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    writer = store.writer("k", "a.txt")
+    writer.append(0, 5, "hello")
+    assert not store.has("k")
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_empty_document(tmp_path):
+    store = ChunkStore(str(tmp_path))
+    write_doc(store, "empty", [])
+    reader = store.open("empty")
+    assert len(reader) == 0 and list(reader) == []
+    reader.close()
+
+
+def test_cleanup_removes_old_then_least_recently_used(tmp_path):
+    store = ChunkStore(str(tmp_path), max_age_days=1, max_bytes=10 ** 9)
+    for key in ("old", "a", "b"):
+        write_doc(store, key, ["x" * 1000])
+    old = store.path("old", ".meta.json")
+    os.utime(old, (0, 0))
+    assert store.cleanup() == 1
+    assert not store.has("old") and store.has("a")
+
+    os.utime(store.path("a", ".meta.json"), (os.path.getmtime(store.path("b", ".meta.json")) - 10,) * 2)
+    store.max_bytes = 1500
+    assert store.cleanup() == 1
+    assert not store.has("a") and store.has("b")
+
+
+def test_chat_messages_are_numbered_per_session(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"), batch_size=3)
+    first = store.create_session("owner", "Chat 1")["id"]
+    second = store.create_session("owner", "Chat 2")["id"]
+    assert [store.add_message(first, "user", f"m{i}") for i in range(4)] == [0, 1, 2, 3]
+    assert store.add_message(second, "user", "other") == 0
+    assert [m["content"] for m in store.messages(first)] == ["m0", "m1", "m2", "m3"]
+    assert [m["seq"] for m in store.messages(first, before=3, limit=2)] == [1, 2]
+    assert store.get_session("owner", first)["messages"] == 4
+
+
+def test_chat_clear_restarts_numbering(tmp_path):
+    store = ChatStore(str(tmp_path / "chats.sqlite3"))
+    session = store.create_session("owner", "Chat")["id"]
+    store.add_message(session, "user", "a")
+    store.add_message(session, "user", "b")
+    store.clear(session)
+    assert store.messages(session) == []
+    assert store.add_message(session, "user", "c") == 0
@@ -0,0 +1,70 @@
+from clauseease.text import GlossaryMatcher, LexicalIndex, tokenize
+
+
+def test_glossary_prefers_longest_term():
+    matcher = GlossaryMatcher({"party": "side", "party of the first part": "the buyer"})
+    assert matcher.replace("A party of the first part and a party.") == "A **the buyer** and a **side**."
+
+
+def test_glossary_whole_words_case_and_wrapping():
+    matcher = GlossaryMatcher({"Hereinafter": "from now on", "in lieu of": "instead of"})
+    assert len(matcher) == 2
+    assert matcher.replace("Hereinafter, paid in\n  lieu of notice") == "**From now on**, paid **instead of** notice"
+    # part of a longer word is not a term
+    assert matcher.replace("hereinaftermore") == "hereinaftermore"
+
+
+def test_glossary_replacements_are_not_rescanned():
+    matcher = GlossaryMatcher({"shall": "must", "must": "WRONG"})
+    assert matcher.replace("It shall pay", template="{}") == "It must pay"
+
+
+def test_glossary_from_csv_overrides_base(tmp_path):
+    path = tmp_path / "terms.csv"
+    path.write_text("# term,replacement\nindemnify,protect\nparty,person\n", encoding="utf-8")
+    matcher = GlossaryMatcher.from_file(str(path), base={"party": "side", "terminate": "end"})
+    assert matcher.replace("Terminate and indemnify the party", template="{}") == "End and protect the person"
+
+
+def test_empty_glossary_matches_nothing():
+    assert GlossaryMatcher({}).replace("anything at all") == "anything at all"
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("The Tenant shall pay the Rent") == ["tenant", "shall", "pay", "rent"]
+
+
+PASSAGES = [
+    {"text": "The tenant pays rent monthly."},
+    {"text": "Either party may terminate with notice.", "search_text": "termination notice terminate party"},
+    {"text": "Rent increases each year by rent review; rent is due in advance.",
+     "fallback": "Rent rises yearly."},
+    {"text": "Governing law is England."},
+]
+
+
+def test_bm25_ranks_by_term_frequency_and_skips_misses():
+    index = LexicalIndex(PASSAGES)
+    hits = index.search("rent")
+    assert [pid for pid, _ in hits] == [2, 0]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("spaceship") == []
+
+
+def test_bm25_scores_search_text_and_limits_top_k():
+    index = LexicalIndex(PASSAGES)
+    assert index.search("termination")[0][0] == 1
+    assert len(index.search("rent notice law", top_k=2)) == 2
+
+
+def test_select_passages_keeps_document_order_within_budget():
+    index = LexicalIndex(PASSAGES)
+    chosen = index.select_passages("rent", token_budget=1000)
+    assert [pid for pid, _ in chosen] == [0, 2]
+    assert index.select_passages("rent", token_budget=1000, exclude={2}) == [(0, PASSAGES[0]["text"])]
+
+
+def test_select_passages_falls_back_to_short_text():
+    index = LexicalIndex(PASSAGES)
+    chosen = dict(index.select_passages("increases", token_budget=6))
+    assert chosen == {2: "Rent rises yearly."}